@@ -0,0 +1,180 @@
+import os
+import asyncio
+import threading
+import http_client
+import metrics
+import prefetch
+
+# Shared asyncio engine for chapter page and image fetches.
+# One event loop runs in a background thread for the whole process; sync
+# callers hand it coroutines through run_sync(). Image fetches fan out with
+# a semaphore instead of a thread per page, so many jobs can share the loop.
+
+try:
+    import aiohttp
+except ImportError:  # Falls back to requests calls offloaded to threads
+    aiohttp = None
+
+# Upper bound on requests in flight across all jobs
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", "64"))
+# Connections kept per host (CDN images, komiku pages)
+ASYNC_MAX_PER_HOST = int(os.getenv("ASYNC_MAX_PER_HOST", "16"))
+# Seconds a HEAD probe may take before the URL counts as unreachable
+PROBE_TIMEOUT = 5
+
+_loop = None
+_loop_lock = threading.Lock()
+_session = None
+_global_limit = None
+
+
+def get_loop():
+    """Return the background event loop, starting its thread on first use"""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                t = threading.Thread(target=loop.run_forever, name="AsyncEngine")
+                t.daemon = True
+                t.start()
+                _loop = loop
+    return _loop
+
+
+def run_sync(coro):
+    """Run a coroutine on the engine loop and block until it finishes"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result()
+
+
+def _limit():
+    global _global_limit
+    if _global_limit is None:
+        _global_limit = asyncio.Semaphore(ASYNC_MAX_CONNECTIONS)
+    return _global_limit
+
+
+async def _get_session():
+    global _session
+    if _session is None or _session.closed:
+        connect_timeout, read_timeout = http_client.DEFAULT_TIMEOUT
+        connector = aiohttp.TCPConnector(
+            limit=ASYNC_MAX_CONNECTIONS,
+            limit_per_host=ASYNC_MAX_PER_HOST,
+            keepalive_timeout=60,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            headers={"User-Agent": http_client.USER_AGENT},
+            timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout),
+        )
+    return _session
+
+
+async def fetch(url, as_text=False):
+    """GET url; returns (status_code, body) with body as str or bytes"""
+    # Chapter pages are fetched as text, images as bytes
+    stage_name = "page_fetch" if as_text else "image_fetch"
+    # Fetched ahead while the user was still choosing the range
+    body = prefetch.store.take(url)
+    if body is not None:
+        return 200, body.decode("utf-8", errors="replace") if as_text else body
+    async with _limit():
+        with metrics.timed(stage_name) as stage:
+            if aiohttp is not None:
+                session = await _get_session()
+                async with session.get(url) as resp:
+                    body = await resp.text(errors="replace") if as_text else await resp.read()
+                    status = resp.status
+            else:
+                loop = asyncio.get_running_loop()
+                resp = await loop.run_in_executor(None, http_client.get, url)
+                status, body = resp.status_code, resp.text if as_text else resp.content
+            if status != 200:
+                stage.fail()
+            stage.add_bytes(len(body))
+            return status, body
+
+
+async def probe(url, timeout=PROBE_TIMEOUT):
+    """HEAD url (following redirects); returns the status code, or None on network errors"""
+    async with _limit():
+        with metrics.timed("page_probe") as stage:
+            try:
+                if aiohttp is not None:
+                    session = await _get_session()
+                    async with session.head(url, allow_redirects=True,
+                                            timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                        status = resp.status
+                else:
+                    loop = asyncio.get_running_loop()
+                    resp = await loop.run_in_executor(
+                        None, lambda: http_client.head(url, allow_redirects=True, timeout=timeout)
+                    )
+                    status = resp.status_code
+            except Exception:
+                stage.fail()
+                return None
+            if status != 200:
+                stage.fail()
+            return status
+
+
+async def fetch_images(img_urls, chapter_folder, store_image, is_cancelled=None, max_workers=None, label="",
+                       executor=None, checkpoint=None):
+    """Fetch page images concurrently and store them as 001.jpg, 002.jpg...
+
+    store_image(content, path) does the decode/write work and returns a short
+    log string; it runs in executor (default thread pool) so the loop never
+    blocks on CPU work. Returns paths in page order with failed pages skipped,
+    or [] if is_cancelled() turns true while pages are in flight.
+
+    With a checkpoint (job_manifest.ChapterCheckpoint), pages it recorded that
+    still verify are kept instead of fetched, and new pages are recorded.
+    """
+    is_cancelled = is_cancelled or (lambda: False)
+    total = len(img_urls)
+    per_chapter = asyncio.Semaphore(max(1, max_workers or ASYNC_MAX_PER_HOST))
+    loop = asyncio.get_running_loop()
+    results = [None] * total
+    done_count = 0
+
+    async def one(index, img_url):
+        nonlocal done_count
+        async with per_chapter:
+            if is_cancelled():
+                return
+            img_path = os.path.join(chapter_folder, f"{index + 1:03}.jpg")
+            if checkpoint is not None and await loop.run_in_executor(None, checkpoint.verified_page, img_path):
+                results[index] = img_path
+                done_count += 1
+                return
+            try:
+                status, content = await fetch(img_url)
+                if status != 200:
+                    raise IOError(f"HTTP {status}")
+                # Temp name + rename so a page is never half written
+                tmp_path = f"{img_path}.part"
+                with metrics.timed("transcode"):
+                    info = await loop.run_in_executor(executor, store_image, content, tmp_path)
+                os.replace(tmp_path, img_path)
+                if checkpoint is not None:
+                    await loop.run_in_executor(None, checkpoint.record_page, img_path)
+            except Exception as e:
+                print(f"    [!] Gagal download {img_url}: {e}")
+                return
+            results[index] = img_path
+            done_count += 1
+            print(f"    > {label}Download gambar {index + 1}/{total} ({done_count} selesai){info or ''}")
+
+    tasks = [asyncio.ensure_future(one(i, url)) for i, url in enumerate(img_urls)]
+    pending = set(tasks)
+    while pending:
+        _, pending = await asyncio.wait(pending, timeout=0.5, return_when=asyncio.FIRST_COMPLETED)
+        if is_cancelled():
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            return []
+
+    return [path for path in results if path]
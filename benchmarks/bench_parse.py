@@ -0,0 +1,175 @@
+"""Parse-time benchmark for series and chapter pages on saved fixtures.
+
+Compares the old BeautifulSoup code (when bs4 is installed) with extractor.py
+on each available backend, and checks that all of them return the same links.
+
+    python benchmarks/bench_parse.py [--repeat 20] [--series page.html] [--chapter page.html]
+    python benchmarks/bench_parse.py --regenerate   # rewrite the synthetic fixtures
+"""
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import extractor  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SERIES_FIXTURE = os.path.join(FIXTURES, "series_1200_chapters.html")
+CHAPTER_FIXTURE = os.path.join(FIXTURES, "chapter_page.html")
+BASE_URL = "https://komiku.org"
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+
+# -------------------- Fixtures --------------------
+def _page(title, body):
+    nav = "\n".join(f'<li><a href="/genre/{g}/">{g.title()}</a></li>' for g in
+                    ("action", "adventure", "comedy", "drama", "fantasy", "romance", "isekai", "seinen"))
+    scripts = "\n".join(f'<script src="/asset/js/app{i}.js"></script>' for i in range(6))
+    return (
+        f'<!DOCTYPE html>\n<html lang="id"><head><meta charset="utf-8"><title>{title}</title>\n'
+        f'<link rel="stylesheet" href="/asset/css/style.css">{scripts}</head>\n'
+        f'<body><header><a href="/"><img src="/asset/img/logo.png" alt="Komiku"></a>'
+        f'<nav><ul>{nav}</ul></nav></header>\n{body}\n'
+        f'<footer><p>&copy; Komiku</p><a href="/pustaka/">Pustaka</a></footer></body></html>\n'
+    )
+
+
+def series_fixture(chapters=1200, slug="one-piece"):
+    rows = []
+    for n in range(chapters, 0, -1):
+        rows.append(
+            f'<tr><td class="judulseries"><a href="/{slug}-chapter-{n}/" title="{slug} Chapter {n}">'
+            f'<span>Chapter {n}</span></a></td><td class="pembaca"><i>{n * 37 % 9000}</i></td>'
+            f'<td class="tanggalseries">{n % 28 + 1:02}/0{n % 9 + 1}/2024</td></tr>'
+        )
+    # Special chapters the parser must keep in the list but not count
+    rows.insert(10, f'<tr><td class="judulseries"><a href="/{slug}-chapter-1050-5/">'
+                    f'<span>Chapter 1050.5</span></a></td></tr>')
+    rows.insert(20, f'<tr><td class="judulseries"><a href="/{slug}-chapter-extra/">'
+                    f'<span>Extra</span></a></td></tr>')
+    body = (
+        f'<article><div class="ims"><img src="https://thumbnail.komiku.org/{slug}.jpg?resize=450" alt=""></div>'
+        f'<div class="new1"><a href="/{slug}-chapter-1/"><span>Awal:</span><span>Chapter 1</span></a></div>'
+        f'<div class="new1"><a href="/{slug}-chapter-{chapters}/"><span>Terbaru:</span>'
+        f'<span>Chapter {chapters}</span></a></div>'
+        f'<p class="desc">' + "Lorem ipsum dolor sit amet &amp; consectetur. " * 40 + "</p>"
+        f'<table id="Daftar_Chapter"><tbody>' + "".join(rows) + "</tbody></table></article>"
+    )
+    return _page(f"Komik {slug}", body)
+
+
+def chapter_fixture(pages=60, slug="one-piece", chapter=1100):
+    images = [
+        '<img src="https://komikuplus.com/banner/top.jpg" alt="iklan">',
+        '<img src="/asset/img/bendera.png" alt="">',
+    ]
+    for i in range(1, pages + 1):
+        attr = "src" if i < 4 else "data-src"
+        images.append(
+            f'<img {attr}="https://img.komiku.org/upload4/{slug}/{chapter}/{slug}-{chapter}-{i}.jpg" '
+            f'alt="{slug} chapter {chapter} - {i}" class="klazy ww" loading="lazy" width="800">'
+        )
+    images.append('<img src="https://komikuplus.com/banner/bottom.jpg" alt="iklan">')
+    body = (
+        f'<div id="Judul"><h1>{slug} Chapter {chapter}</h1></div>'
+        f'<div id="Baca_Komik">' + "\n".join(images) + '</div>'
+        f'<div class="nxpr"><a href="/{slug}-chapter-{chapter - 1}/">Prev</a>'
+        f'<a href="/{slug}-chapter-{chapter + 1}/">Next</a></div>'
+    )
+    return _page(f"{slug} Chapter {chapter}", body)
+
+
+def write_fixtures():
+    os.makedirs(FIXTURES, exist_ok=True)
+    with open(SERIES_FIXTURE, "w", encoding="utf-8") as f:
+        f.write(series_fixture())
+    with open(CHAPTER_FIXTURE, "w", encoding="utf-8") as f:
+        f.write(chapter_fixture())
+
+
+# -------------------- Parsers --------------------
+def bs4_chapter_links(html):
+    soup = BeautifulSoup(html, "html.parser")
+    return [link["href"] for link in soup.select("a[href*='chapter']")]
+
+
+def bs4_image_urls(html):
+    soup = BeautifulSoup(html, "html.parser")
+    urls = []
+    for img in soup.select("img"):
+        src = img.get("src") or img.get("data-src")
+        if src and (src.endswith(".jpg") or src.endswith(".png")):
+            if "komikuplus" in src or "asset/img" in src:
+                continue
+            urls.append(extractor.absolute_url(src, BASE_URL))
+    return urls
+
+
+def with_backend(backend, fn):
+    def run(html):
+        previous = extractor.EXTRACTOR_BACKEND
+        extractor.EXTRACTOR_BACKEND = backend
+        try:
+            return fn(html)
+        finally:
+            extractor.EXTRACTOR_BACKEND = previous
+    return run
+
+
+def bench(fn, html, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(html)
+        timings.append(time.perf_counter() - start)
+    return min(timings), sorted(timings)[len(timings) // 2], result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--series", default=SERIES_FIXTURE, help="saved series page HTML")
+    parser.add_argument("--chapter", default=CHAPTER_FIXTURE, help="saved chapter page HTML")
+    parser.add_argument("--regenerate", action="store_true", help="rewrite the synthetic fixtures")
+    args = parser.parse_args()
+
+    if args.regenerate or not os.path.exists(SERIES_FIXTURE) or not os.path.exists(CHAPTER_FIXTURE):
+        write_fixtures()
+
+    cases = []
+    for label, path, legacy, new in (
+        ("series", args.series, bs4_chapter_links, extractor.extract_chapter_links),
+        ("chapter", args.chapter, bs4_image_urls, lambda html: extractor.extract_image_urls(html, BASE_URL)),
+    ):
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        parsers = []
+        if BeautifulSoup is not None:
+            parsers.append(("bs4 html.parser (old)", legacy))
+        parsers.append(("extractor html.parser", with_backend("html.parser", new)))
+        if extractor.etree is not None:
+            parsers.append(("extractor lxml", with_backend("lxml", new)))
+        cases.append((label, path, html, parsers))
+
+    print(f"{'page':<8} {'parser':<24} {'best ms':>9} {'p50 ms':>9} {'items':>6}")
+    for label, path, html, parsers in cases:
+        reference = None
+        for name, fn in parsers:
+            best, p50, result = bench(fn, html, args.repeat)
+            if reference is None:
+                reference = result
+            status = "" if result == reference else "  MISMATCH"
+            print(f"{label:<8} {name:<24} {best * 1000:>9.2f} {p50 * 1000:>9.2f} {len(result):>6}{status}")
+        print(f"{'':<8} ({os.path.basename(path)}, {len(html) / 1024:.0f}KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""End-to-end benchmark of download -> PDF -> upload against a local fake Komiku/GoFile.
+
+Runs fully offline. Every iteration starts from an empty cache so the cold
+path is measured.
+
+    python benchmarks/bench_pipeline.py [--chapters 3] [--pages 20] [--iterations 3] [--big]
+    python benchmarks/bench_pipeline.py --json results.json
+
+Peak RSS is this process only (transcode worker processes are not included);
+it is reset before each stage on Linux, so it is a per-stage figure there.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_komiku import FakeKomiku  # noqa: E402
+
+
+def _reset_peak_rss():
+    """Reset VmHWM so the next reading is the peak of the coming stage (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = (len(ordered) - 1) * pct / 100
+    low = int(index)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (index - low)
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.durations = []
+        self.pages = 0
+        self.bytes = 0
+        self.peak_rss_mb = 0.0
+
+    def measure(self, fn, *args, pages=None, nbytes=None):
+        """Run fn(*args), record its wall time; pages/nbytes may be callables of the result"""
+        _reset_peak_rss()
+        start = time.perf_counter()
+        result = fn(*args)
+        self.durations.append(time.perf_counter() - start)
+        self.peak_rss_mb = max(self.peak_rss_mb, _peak_rss_mb())
+        self.pages += pages(result) if callable(pages) else (pages or 0)
+        self.bytes += nbytes(result) if callable(nbytes) else (nbytes or 0)
+        return result
+
+    def summary(self):
+        total = sum(self.durations)
+        return {
+            "stage": self.name,
+            "calls": len(self.durations),
+            "total_s": total,
+            "p50_ms": percentile(self.durations, 50) * 1000,
+            "p95_ms": percentile(self.durations, 95) * 1000,
+            "pages_per_s": self.pages / total if total else 0.0,
+            "mb_per_s": self.bytes / (1024 * 1024) / total if total else 0.0,
+            "peak_rss_mb": self.peak_rss_mb,
+        }
+
+
+def _clear_dir(path):
+    """Empty a directory but keep it; the cache objects create theirs only once"""
+    for name in os.listdir(path):
+        full = os.path.join(path, name)
+        if os.path.isdir(full):
+            shutil.rmtree(full, ignore_errors=True)
+        else:
+            os.remove(full)
+
+
+def _files_size(paths):
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="bench-pipeline-")
+    cache_dir = os.path.join(workdir, "cache")
+    output_dir = os.path.join(workdir, "downloads")
+
+    with FakeKomiku(chapters=args.chapters, pages=args.pages, width=args.width, height=args.height,
+                    latency=args.latency / 1000) as fake:
+        # Module-level settings are read at import time
+        os.environ["CACHE_DIR"] = cache_dir
+        os.environ["KOMIKU_BASE_URL"] = fake.url
+        os.environ["GOFILE_API_URL"] = fake.gofile_api_url
+        os.environ["GOFILE_UPLOAD_URL"] = fake.gofile_upload_url
+        os.environ.setdefault("NO_PROXY", "127.0.0.1,localhost")
+
+        import downloader
+        import transcode
+        from uploader import GoFileUploader
+
+        stages = {name: StageStats(name) for name in
+                  ("get_manga_info", "download_chapter", "download_chapter_big", "create_pdf", "upload_file")}
+        uploader = GoFileUploader()
+
+        try:
+            for iteration in range(args.iterations):
+                for cache in (downloader.manga_cache, downloader.chapter_cache):
+                    _clear_dir(cache.directory)
+                shutil.rmtree(output_dir, ignore_errors=True)
+                os.makedirs(output_dir)
+                print(f"--- iteration {iteration + 1}/{args.iterations}")
+
+                info = stages["get_manga_info"].measure(downloader.get_manga_info, fake.manga_url())
+                base_url, _, _, chapters = info
+                if not base_url:
+                    raise RuntimeError("get_manga_info failed against the fake server")
+
+                modes = [("download_chapter", downloader.download_chapter)]
+                if args.big:
+                    modes.append(("download_chapter_big", downloader.download_chapter_big))
+
+                for stage_name, download in modes:
+                    all_images = []
+                    for chapter in chapters:
+                        images = stages[stage_name].measure(
+                            download, base_url.format(chapter), chapter, output_dir,
+                            pages=len, nbytes=_files_size
+                        )
+                        all_images.extend(images)
+
+                    pdf_path = os.path.join(output_dir, f"{stage_name}.pdf")
+                    stages["create_pdf"].measure(
+                        downloader.create_pdf, all_images, pdf_path,
+                        pages=len(all_images), nbytes=lambda _: _files_size([pdf_path])
+                    )
+                    stages["upload_file"].measure(
+                        uploader.upload_file, pdf_path,
+                        pages=len(all_images), nbytes=lambda result: result["file_size"] if result else 0
+                    )
+        finally:
+            transcode.shutdown()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return [stage.summary() for stage in stages.values() if stage.durations]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chapters", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=20, help="content pages per chapter")
+    parser.add_argument("--width", type=int, default=800)
+    parser.add_argument("--height", type=int, default=6000)
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated server latency per GET (ms)")
+    parser.add_argument("--big", action="store_true", help="also run download_chapter_big")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = run(args)
+
+    print()
+    print(f"{args.chapters} chapters x {args.pages} pages ({args.width}x{args.height}), "
+          f"{args.iterations} iterations, latency {args.latency:g}ms")
+    print(f"{'stage':<22} {'calls':>5} {'p50 ms':>9} {'p95 ms':>9} {'pages/s':>9} {'MB/s':>8} {'peak MB':>8}")
+    for r in results:
+        print(f"{r['stage']:<22} {r['calls']:>5} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+              f"{r['pages_per_s']:>9.1f} {r['mb_per_s']:>8.1f} {r['peak_rss_mb']:>8.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "stages": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
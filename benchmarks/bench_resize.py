@@ -0,0 +1,112 @@
+"""Compare the tiled draft/reduce resize engine with the old full-decode resize.
+
+Runs every case in a fresh subprocess so peak RSS is measured per case.
+
+    python benchmarks/bench_resize.py [--width 800] [--height 12000] [--repeat 3]
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import resource
+import subprocess
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+import transcode  # noqa: E402
+
+CASES = {
+    # name: (scale, description)
+    "big_upscale": (None, "big mode upscale (>=1200px wide / 150%)"),
+    "pdf_downscale": (0.8, "create_pdf 0.8x downscale"),
+    "half_downscale": (0.45, "0.45x downscale"),
+}
+
+
+def make_strip(width, height):
+    """Synthetic webtoon strip: gradient panels with some line art, saved as JPEG"""
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    panel = 900
+    for top in range(0, height, panel):
+        shade = (top // panel * 37) % 200
+        draw.rectangle([20, top + 20, width - 20, top + panel - 20], fill=(shade, 255 - shade, 180))
+        for x in range(40, width - 40, 60):
+            draw.line([x, top + 40, width - x, top + panel - 40], fill=(0, 0, 0), width=3)
+    buffer = BytesIO()
+    img.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def target_size(case, width, height):
+    scale = CASES[case][0]
+    if scale is None:
+        return transcode.big_mode_size(width, height)
+    return transcode.scaled_size(width, height, scale)
+
+
+def old_resize(data, case):
+    img = Image.open(BytesIO(data)).convert("RGB")
+    return img.resize(target_size(case, *img.size), Image.Resampling.LANCZOS)
+
+
+def new_resize(data, case):
+    width, height = Image.open(BytesIO(data)).size
+    size = target_size(case, width, height)
+    return transcode.resize_image(transcode.load_image(data, size), size)
+
+
+def run_case(case, engine, width, height, repeat):
+    data = make_strip(width, height)
+    fn = new_resize if engine == "new" else old_resize
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(data, case)
+        out.save(BytesIO(), "JPEG", quality=85)
+        timings.append(time.perf_counter() - start)
+        out.close()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "best": min(timings),
+        "mean": sum(timings) / len(timings),
+        # ru_maxrss is KiB on Linux
+        "peak_mb": peak_rss / 1024,
+        "delta_mb": (peak_rss - baseline_rss) / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=800)
+    parser.add_argument("--height", type=int, default=12000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--engine", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(args.case, args.engine, args.width, args.height, args.repeat)
+        return
+
+    print(f"Strip {args.width}x{args.height}, best of {args.repeat}")
+    print(f"{'case':<42} {'engine':<6} {'best s':>8} {'mean s':>8} {'peak MB':>9} {'+MB':>8}")
+    for case, (_, description) in CASES.items():
+        for engine in ("old", "new"):
+            proc = subprocess.run(
+                [sys.executable, __file__, "--case", case, "--engine", engine,
+                 "--width", str(args.width), "--height", str(args.height), "--repeat", str(args.repeat)],
+                capture_output=True, text=True, check=True
+            )
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            print(f"{description:<42} {engine:<6} {result['best']:>8.3f} {result['mean']:>8.3f} "
+                  f"{result['peak_mb']:>9.1f} {result['delta_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
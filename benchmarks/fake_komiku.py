@@ -0,0 +1,165 @@
+"""Local stand-in for Komiku and GoFile used by the offline benchmarks.
+
+Serves synthetic pages shaped like the real site:
+
+    /manga/<slug>/                  series page with chapter links
+    /<slug>-chapter-<n>/            chapter page: 3 header images, pages, 1 footer image
+    /img/<slug>/<n>/<page>.jpg      page image (one pre-rendered JPEG strip)
+    /servers                        GoFile server list
+    /upload/<server>/contents/uploadfile   GoFile upload (body is read and discarded)
+"""
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench_resize import make_strip
+
+
+class FakeKomiku:
+    def __init__(self, chapters=3, pages=20, width=800, height=6000, latency=0.0, host="127.0.0.1", port=0):
+        self.chapters = chapters
+        self.pages = pages
+        self.latency = latency
+        self.image = make_strip(width, height)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def manga_url(self, slug="bench-manga"):
+        return f"{self.url}/manga/{slug}/"
+
+    @property
+    def gofile_api_url(self):
+        return self.url
+
+    @property
+    def gofile_upload_url(self):
+        return self.url + "/upload/{server}/contents/uploadfile"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="FakeKomiku")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def counters(self):
+        with self._lock:
+            return self.bytes_sent, self.bytes_received
+
+    def _count(self, sent=0, received=0):
+        with self._lock:
+            self.bytes_sent += sent
+            self.bytes_received += received
+
+    # -------------------- Pages --------------------
+    def series_page(self, slug):
+        links = "\n".join(
+            f'<a href="/{slug}-chapter-{n}/">Chapter {n}</a>' for n in range(self.chapters, 0, -1)
+        )
+        return f"<html><body><h1>{slug}</h1>\n{links}\n</body></html>"
+
+    def chapter_page(self, slug, chapter):
+        # Header/footer images mimic the site chrome the downloader skips
+        images = [f'<img src="{self.url}/img/{slug}/{chapter}/header{i}.jpg">' for i in range(3)]
+        images += [f'<img src="{self.url}/img/{slug}/{chapter}/{page:03}.jpg">' for page in range(1, self.pages + 1)]
+        images.append(f'<img src="{self.url}/img/{slug}/{chapter}/footer.jpg">')
+        images.append(f'<img src="{self.url}/asset/img/logo.png">')
+        return "<html><body>\n" + "\n".join(images) + "\n</body></html>"
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body, content_type):
+                if isinstance(body, str):
+                    body = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                fake._count(sent=len(body))
+
+            def _send_json(self, payload):
+                self._send(200, json.dumps(payload), "application/json")
+
+            def do_HEAD(self):
+                known = ("-chapter-" in self.path or self.path.startswith("/manga/")
+                         or self.path.endswith("/contents/uploadfile"))
+                self.send_response(200 if known else 404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if fake.latency:
+                    time.sleep(fake.latency)
+
+                if path.startswith("/manga/"):
+                    slug = path.strip("/").split("/")[-1]
+                    self._send(200, fake.series_page(slug), "text/html; charset=utf-8")
+                elif path.startswith("/img/"):
+                    self._send(200, fake.image, "image/jpeg")
+                elif path == "/servers":
+                    self._send_json({"status": "ok", "data": {"servers": [{"name": "store1", "zone": "eu"}]}})
+                elif "-chapter-" in path:
+                    slug, chapter = path.strip("/").rsplit("-chapter-", 1)
+                    if chapter.isdigit() and 1 <= int(chapter) <= fake.chapters:
+                        self._send(200, fake.chapter_page(slug, int(chapter)), "text/html; charset=utf-8")
+                    else:
+                        self._send(404, "not found", "text/plain")
+                else:
+                    self._send(404, "not found", "text/plain")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                remaining = length
+                while remaining > 0:
+                    chunk = self.rfile.read(min(remaining, 1 << 20))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                fake._count(received=length - remaining)
+
+                if self.path.endswith("/contents/uploadfile"):
+                    code = f"bench{int(time.time() * 1000) % 100000}"
+                    # Guest uploads create a folder; a Bearer token reuses the caller's folder
+                    token = (self.headers.get("Authorization") or "").replace("Bearer ", "")
+                    folder = token.replace("guest-", "") if token else f"folder{code}"
+                    self._send_json({"status": "ok", "data": {
+                        "code": code,
+                        "downloadPage": f"{fake.url}/d/{folder}",
+                        "link": f"{fake.url}/download/{code}",
+                        "parentFolder": folder,
+                        "parentFolderCode": folder,
+                        "guestToken": f"guest-{folder}",
+                    }})
+                else:
+                    self._send(404, "not found", "text/plain")
+
+        return Handler
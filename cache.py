@@ -0,0 +1,355 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+# On-disk caches. Lives outside downloads/ because that folder is wiped on
+# startup and by the error cleanup.
+CACHE_DIR = os.getenv("CACHE_DIR", "cache")
+
+# Series pages are considered fresh for this many seconds
+MANGA_CACHE_TTL = int(os.getenv("MANGA_CACHE_TTL", "1800"))
+
+# Size cap for downloaded chapter pages shared across users
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_MB", "1024")) * 1024 * 1024
+
+# Size cap for finished PDFs
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_MB", "2048")) * 1024 * 1024
+
+
+def _key_hash(key):
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def write_json_atomic(path, data):
+    """Write JSON under a temp name and rename it, so readers never see a half-written file"""
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def file_sha256(path):
+    """Hex sha256 of a file, read in 1MB blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _link_or_copy(src, dst):
+    """Hardlink when possible (same filesystem), otherwise copy"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def series_slug(chapter_url):
+    """'https://komiku.org/one-piece-chapter-1100/' -> 'one-piece'"""
+    path = chapter_url.split("://", 1)[-1].split("/", 1)[-1]
+    return path.split("-chapter-")[0].strip("/")
+
+
+def read_json(path):
+    """Parsed JSON file, or None if it is missing or unreadable"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class MetadataCache:
+    """Series metadata (base_url, name, chapter list) keyed by manga URL.
+
+    Entries keep the ETag/Last-Modified of the series page so a stale entry
+    can be revalidated with a conditional GET instead of a full re-parse.
+    """
+
+    def __init__(self, directory=None, ttl=MANGA_CACHE_TTL):
+        self.directory = directory or os.path.join(CACHE_DIR, "manga")
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, manga_url):
+        return os.path.join(self.directory, f"{_key_hash(manga_url.rstrip('/'))}.json")
+
+    def load(self, manga_url):
+        entry = read_json(self._path(manga_url))
+        if not entry or not entry.get("base_url") or not entry.get("chapters"):
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        return time.time() - entry.get("fetched_at", 0) < self.ttl
+
+    def store(self, manga_url, info, etag=None, last_modified=None, body_hash=None):
+        entry = dict(info)
+        entry.update({
+            "url": manga_url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "body_hash": body_hash,
+            "fetched_at": time.time(),
+        })
+        with self._lock:
+            write_json_atomic(self._path(manga_url), entry)
+        return entry
+
+    def touch(self, manga_url, entry):
+        """Mark an entry as revalidated without changing its content"""
+        entry["fetched_at"] = time.time()
+        with self._lock:
+            write_json_atomic(self._path(manga_url), entry)
+        return entry
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+
+class ChapterCache:
+    """Content-addressed page cache keyed by (series slug, chapter, mode).
+
+    Every stored file is recorded with its size and sha256 and checked again
+    before it is served. Total size is capped; least recently used chapters
+    are evicted first.
+    """
+
+    def __init__(self, directory=None, max_bytes=PAGE_CACHE_MAX_BYTES):
+        self.directory = directory or os.path.join(CACHE_DIR, "pages")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(self.directory, "index.json")
+        os.makedirs(self.directory, exist_ok=True)
+        self._index = read_json(self._index_path) or {}
+
+    @staticmethod
+    def _key(slug, chapter, mode):
+        return _key_hash(f"{slug}|{chapter}|{mode}")
+
+    def _save_index(self):
+        write_json_atomic(self._index_path, self._index)
+
+    def _drop(self, key):
+        self._index.pop(key, None)
+        shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+
+    def contains(self, slug, chapter, mode):
+        """True if the chapter has an entry; files are only verified by get()"""
+        with self._lock:
+            return self._key(slug, chapter, mode) in self._index
+
+    def get(self, slug, chapter, mode, dest_folder):
+        """Place cached pages into dest_folder and return their paths, or None on miss"""
+        key = self._key(slug, chapter, mode)
+        with self._lock:
+            entry = self._index.get(key)
+            if not entry:
+                return None
+            entry["last_access"] = time.time()
+            files = list(entry["files"])
+
+        entry_dir = os.path.join(self.directory, key)
+        os.makedirs(dest_folder, exist_ok=True)
+        paths = []
+        for item in files:
+            src = os.path.join(entry_dir, item["name"])
+            try:
+                valid = os.path.getsize(src) == item["size"] and file_sha256(src) == item["sha256"]
+            except OSError:
+                valid = False
+            if not valid:
+                print(f"[!] Cache rusak untuk {slug} chapter {chapter} ({mode}), download ulang")
+                with self._lock:
+                    self._drop(key)
+                    self._save_index()
+                return None
+
+            dst = os.path.join(dest_folder, item["name"])
+            if os.path.exists(dst):
+                os.remove(dst)
+            _link_or_copy(src, dst)
+            paths.append(dst)
+
+        with self._lock:
+            self._save_index()
+        return paths
+
+    def put(self, slug, chapter, mode, image_paths):
+        """Store a fully downloaded chapter"""
+        if not image_paths:
+            return
+        key = self._key(slug, chapter, mode)
+        entry_dir = os.path.join(self.directory, key)
+        tmp_dir = f"{entry_dir}.{threading.get_ident()}.tmp"
+
+        try:
+            os.makedirs(tmp_dir, exist_ok=True)
+            files = []
+            total = 0
+            for path in image_paths:
+                name = os.path.basename(path)
+                dst = os.path.join(tmp_dir, name)
+                _link_or_copy(path, dst)
+                size = os.path.getsize(dst)
+                files.append({"name": name, "size": size, "sha256": file_sha256(dst)})
+                total += size
+
+            with self._lock:
+                if key in self._index:
+                    # Another job cached the same chapter first
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                    return
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                os.replace(tmp_dir, entry_dir)
+                self._index[key] = {
+                    "slug": slug,
+                    "chapter": chapter,
+                    "mode": mode,
+                    "files": files,
+                    "bytes": total,
+                    "last_access": time.time(),
+                }
+                self._evict()
+                self._save_index()
+        except Exception as e:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            print(f"[!] Gagal menyimpan cache chapter {chapter}: {e}")
+
+    def _evict(self):
+        total = sum(entry["bytes"] for entry in self._index.values())
+        if total <= self.max_bytes:
+            return
+        for key, entry in sorted(self._index.items(), key=lambda kv: kv[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            total -= entry["bytes"]
+            self._drop(key)
+            print(f"🗑️ Cache evicted: {entry['slug']} chapter {entry['chapter']} ({entry['mode']})")
+
+
+def artifact_key(slug, chapters, mode, settings=None):
+    """Stable key for a built PDF: series, exact chapter list, normal/big and PDF settings"""
+    settings_str = json.dumps(settings or {}, sort_keys=True)
+    return _key_hash(f"{slug}|{','.join(str(ch) for ch in chapters)}|{mode}|{settings_str}")
+
+
+class PDFCache:
+    """Finished PDFs keyed by artifact_key(), evicted LRU by total bytes"""
+
+    def __init__(self, directory=None, max_bytes=PDF_CACHE_MAX_BYTES):
+        self.directory = directory or os.path.join(CACHE_DIR, "pdf")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(self.directory, "index.json")
+        os.makedirs(self.directory, exist_ok=True)
+        self._index = read_json(self._index_path) or {}
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def _save_index(self):
+        write_json_atomic(self._index_path, self._index)
+
+    def _drop(self, key):
+        self._index.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def get(self, key, dest_path):
+        """Place the cached PDF at dest_path; returns False on miss"""
+        with self._lock:
+            entry = self._index.get(key)
+            if not entry:
+                return False
+            src = self._path(key)
+            try:
+                valid = os.path.getsize(src) == entry["bytes"]
+            except OSError:
+                valid = False
+            if not valid:
+                self._drop(key)
+                self._save_index()
+                return False
+
+            if os.path.exists(dest_path):
+                os.remove(dest_path)
+            _link_or_copy(src, dest_path)
+            entry["last_access"] = time.time()
+            self._save_index()
+            return True
+
+    def put(self, key, pdf_path, label=""):
+        if not os.path.exists(pdf_path):
+            return
+        tmp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+        try:
+            _link_or_copy(pdf_path, tmp_path)
+            size = os.path.getsize(tmp_path)
+            if size > self.max_bytes:
+                os.remove(tmp_path)
+                return
+            with self._lock:
+                os.replace(tmp_path, self._path(key))
+                self._index[key] = {"label": label, "bytes": size, "last_access": time.time()}
+                self._evict()
+                self._save_index()
+        except Exception as e:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            print(f"[!] Gagal menyimpan cache PDF {label}: {e}")
+
+    def _evict(self):
+        total = sum(entry["bytes"] for entry in self._index.values())
+        if total <= self.max_bytes:
+            return
+        for key, entry in sorted(self._index.items(), key=lambda kv: kv[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            total -= entry["bytes"]
+            self._drop(key)
+            print(f"🗑️ Cache PDF evicted: {entry['label']}")
+
+
+class FileIdIndex:
+    """Telegram file_id of PDFs already sent, keyed by artifact_key()"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, "telegram_file_ids.json")
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._index = read_json(self.path) or {}
+
+    def get(self, key):
+        with self._lock:
+            return self._index.get(key)
+
+    def put(self, key, file_id, caption=None):
+        with self._lock:
+            self._index[key] = {"file_id": file_id, "caption": caption, "sent_at": time.time()}
+            write_json_atomic(self.path, self._index)
+
+    def remove(self, key):
+        with self._lock:
+            if self._index.pop(key, None) is not None:
+                write_json_atomic(self.path, self._index)
+
+
+manga_cache = MetadataCache()
+chapter_cache = ChapterCache()
+pdf_cache = PDFCache()
+file_id_index = FileIdIndex()
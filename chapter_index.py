@@ -0,0 +1,103 @@
+import re
+from bisect import bisect_left, bisect_right
+
+# Chapter identifiers as they appear in Komiku URLs ("...-chapter-<id>/"):
+# plain numbers ("1", "01"), decimals ("1.5", or "160-5" on older series)
+# and extras ("extra", "spesial") that have no number.
+_NUMBERED = re.compile(r"^(\d+)(?:[.-](\d+))?$")
+
+
+def chapter_number(chapter):
+    """Numeric value of a chapter identifier: '01' -> 1, '1.5'/'1-5' -> 1.5, None for extras"""
+    match = _NUMBERED.match(str(chapter).strip().strip("/").lower())
+    if not match:
+        return None
+    whole, fraction = match.groups()
+    if fraction is None:
+        return int(whole)
+    return float(f"{whole}.{fraction}")
+
+
+class ChapterIndex:
+    """Chapters of one series in reading order, with dict lookup and range slicing.
+
+    Built once from the identifiers scraped off the series page. Numbered
+    chapters are ordered by value ('9' < '10' < '10.5'), extras follow in page
+    order. Each chapter is held once: spellings of the same number ('2'/'02',
+    '1.5'/'1-5') collapse to the first one listed, and the others are kept as
+    aliases that resolve to it.
+    """
+
+    def __init__(self, chapters):
+        numbered = []
+        extras = []
+        # Lowercased spelling -> canonical chapter identifier
+        self._aliases = {}
+        self._by_number = {}
+        for chapter in chapters:
+            if not chapter or chapter.lower() in self._aliases:
+                continue
+            number = chapter_number(chapter)
+            if number is None:
+                extras.append(chapter)
+            elif number in self._by_number:
+                # Another spelling of a chapter already listed
+                self._aliases[chapter.lower()] = self._by_number[number]
+                continue
+            else:
+                self._by_number[number] = chapter
+                numbered.append((number, chapter))
+            self._aliases[chapter.lower()] = chapter
+        numbered.sort(key=lambda item: item[0])
+
+        self.chapters = [chapter for _, chapter in numbered] + extras
+        # Sorted numbers of chapters[:len(numbered)], for bisect range queries
+        self._numbers = [number for number, _ in numbered]
+        self._position = {chapter: i for i, chapter in enumerate(self.chapters)}
+
+    def __len__(self):
+        return len(self.chapters)
+
+    def __iter__(self):
+        return iter(self.chapters)
+
+    def __contains__(self, chapter):
+        return chapter in self._position
+
+    @property
+    def total(self):
+        """Number of distinct chapters, or None when the page listed none"""
+        return len(self.chapters) or None
+
+    def resolve(self, text):
+        """Chapter identifier matching user input ('1', '01', '1.5', 'extra'), or None"""
+        text = str(text).strip()
+        chapter = self._aliases.get(text.lower())
+        if chapter is not None:
+            return chapter
+        number = chapter_number(text)
+        return self._by_number.get(number) if number is not None else None
+
+    def position(self, chapter):
+        return self._position.get(chapter)
+
+    def slice(self, start, end):
+        """Chapters from start to end inclusive, in reading order; [] if either is unknown or end < start"""
+        start_pos = self._position.get(start)
+        end_pos = self._position.get(end)
+        if start_pos is None or end_pos is None or end_pos < start_pos:
+            return []
+        return self.chapters[start_pos:end_pos + 1]
+
+    def between(self, low, high):
+        """Numbered chapters with low <= number <= high"""
+        return self.chapters[bisect_left(self._numbers, low):bisect_right(self._numbers, high)]
+
+    def around(self, text, count=15):
+        """Up to count chapters nearest to the number in text (the first ones if it has none)"""
+        number = chapter_number(text)
+        if number is None or not self._numbers:
+            return self.chapters[:count]
+        center = bisect_left(self._numbers, number)
+        start = max(0, min(center - count // 2, len(self._numbers) - count))
+        return self.chapters[start:start + count]
@@ -1,294 +1,540 @@
 # downloader.py
 import os
-import requests
-from bs4 import BeautifulSoup
+import hashlib
+from urllib.parse import urljoin
+import http_client
 from PIL import Image
 from io import BytesIO
+import asyncio
+import async_engine
+import metrics
+import transcode
+from transcode import transcode_big
+from imageutil import is_passthrough_jpeg, sniff_format
+from pdf_writer import StreamingPDFWriter
+from page_encoder import TargetSizeEncoder
+from cache import manga_cache, chapter_cache, series_slug
+from extractor import extract_chapter_links, extract_image_urls
+from chapter_index import ChapterIndex
+
+# Komiku site root; overridable so benchmarks can point at a local stand-in
+KOMIKU_BASE_URL = os.getenv("KOMIKU_BASE_URL", "https://komiku.org").rstrip("/")
+
+# Number of page images fetched in parallel per chapter
+MAX_IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "8"))
+
+# Store baseline JPEGs from the CDN byte-for-byte instead of decode + re-encode
+IMAGE_PASSTHROUGH = os.getenv("IMAGE_PASSTHROUGH", "1") != "0"
+
+# Pages above this many pixels are downscaled before going into the PDF
+PDF_MAX_PIXELS = 4000000
+# Re-encoded pages use this quality unless a size target forces it lower,
+# never below PDF_MIN_QUALITY (scale is reduced instead)
+PDF_JPEG_QUALITY = 85
+PDF_MIN_QUALITY = int(os.getenv("PDF_MIN_QUALITY", "50"))
+
+# Byte budget per merged PDF part; Telegram bots can send documents up to 50MB
+PDF_PART_MAX_BYTES = int(float(os.getenv("PDF_PART_MAX_MB", "48")) * 1024 * 1024)
+# Bytes a page adds besides its JPEG data: image/content/page objects while
+# streaming, plus its xref entries and page-tree reference written on close
+PDF_PAGE_OVERHEAD = 600
+# Catalog, page tree header, xref header and trailer
+PDF_FILE_OVERHEAD = 512
+
+
+def pdf_settings(max_bytes=None):
+    """Settings that change create_pdf output; part of the PDF cache key"""
+    return {
+        "quality": PDF_JPEG_QUALITY,
+        "min_quality": PDF_MIN_QUALITY,
+        "max_pixels": PDF_MAX_PIXELS,
+        "passthrough": IMAGE_PASSTHROUGH,
+        "target": max_bytes,
+    }
+
+
+def chapter_dir(output_dir, chapter_url, chapter_num, mode="normal"):
+    """Working folder of a chapter's pages; namespaced by series so same-numbered chapters never share one"""
+    suffix = "-big" if mode == "big" else ""
+    return os.path.join(output_dir, series_slug(chapter_url), f"chapter-{chapter_num}{suffix}")
+
+
+def _is_cancelled(chat_id, user_cancel):
+    return bool(user_cancel and chat_id and user_cancel.get(chat_id))
+
+
+def _store_image_normal(content, img_path):
+    if IMAGE_PASSTHROUGH and is_passthrough_jpeg(content):
+        # Already a plain JPEG: write it untouched, no generational loss
+        with open(img_path, "wb") as f:
+            f.write(content)
+        return ""
+
+    # PNG/WebP, CMYK or progressive JPEG: normalize to baseline RGB JPEG
+    img = Image.open(BytesIO(content)).convert("RGB")
+    img.save(img_path, "JPEG")
+    return f" ({sniff_format(content) or 'unknown'} → jpeg)"
+
+
+# -------------------- Fungsi Ambil Data Manga --------------------
+def _parse_manga_page(html):
+    """Extract base_url, name, total and sorted chapter list from a series page"""
+    chapter_links = extract_chapter_links(html)
+    if not chapter_links:
+        return None
+
+    first_chapter = chapter_links[0]
+    if not first_chapter.startswith("http"):
+        first_chapter = KOMIKU_BASE_URL + first_chapter
+
+    slug = first_chapter.split("-chapter-")[0].replace(KOMIKU_BASE_URL + "/", "").strip("/")
+    base_url = f"{KOMIKU_BASE_URL}/{slug}-chapter-{{}}/"
+    manga_name = slug.split("/")[-1]
+
+    chapter_list = []  # Store all chapter identifiers
+    chapter_urls = {}  # Chapter -> page URL exactly as the series page links it
+    for href in chapter_links:
+        if "-chapter-" in href:
+            chapter_str = href.split("-chapter-")[-1].replace("/", "").split("?")[0]
+            chapter_list.append(chapter_str)
+            chapter_urls.setdefault(chapter_str, urljoin(KOMIKU_BASE_URL + "/", href))
+
+    # Numbered chapters by value, extras ("extra", "spesial") after them
+    index = ChapterIndex(chapter_list)
+    sorted_chapters = index.chapters
+    total_chapters = index.total
+
+    return {
+        "base_url": base_url,
+        "manga_name": manga_name,
+        "total_chapters": total_chapters,
+        "chapters": sorted_chapters,
+        "chapter_urls": chapter_urls,
+    }
+
+
+def _manga_info_tuple(entry):
+    """Public (base_url, name, total, chapters) tuple of a cached series entry"""
+    return entry["base_url"], entry["manga_name"], entry["total_chapters"], entry["chapters"]
+
+
+def chapter_page_urls(manga_url, chapters):
+    """Page URLs of chapters exactly as the cached series page links them.
+
+    Chapters the page does not list are left out; their downloads fall back
+    to the base_url pattern. Resolved when a job is created so the URLs are
+    saved with it and still known when the job resumes after a restart.
+    """
+    entry = manga_cache.load(manga_url) if manga_url else None
+    listed = (entry or {}).get("chapter_urls") or {}
+    return {str(ch): listed[str(ch)] for ch in chapters if str(ch) in listed}
+
+
+def _candidate_urls(chapter_url, chapter_num):
+    """Spellings a chapter page URL may use on the site, most likely first"""
+    chapter = str(chapter_num)
+    candidates = [chapter_url]
+    # Chapters 1-9 are sometimes published as 01-09
+    if chapter.isdigit() and 1 <= int(chapter) <= 9:
+        candidates.append(chapter_url.replace(f"-{chapter}/", f"-0{chapter}/"))
+    # Decimal chapters are sometimes published as 160-5 instead of 160.5
+    if "." in chapter:
+        candidates.append(chapter_url.replace(f"-{chapter}/", f"-{chapter.replace('.', '-')}/"))
+    return candidates
+
+
+async def _fetch_chapter_page(chapter_url, chapter_num, page_url=None, label=""):
+    """Return (url, html) of a chapter page, or (None, None) if it cannot be fetched.
+
+    page_url, the URL scraped from the series page, is fetched directly. A
+    chapter that was not listed there (or whose listed URL fails) gets its
+    candidate URLs probed with concurrent HEAD requests; the first one that
+    answers is fetched.
+    """
+    if page_url:
+        status, html = await async_engine.fetch(page_url, as_text=True)
+        if status == 200:
+            return page_url, html
+
+    candidates = [url for url in _candidate_urls(chapter_url, chapter_num) if url != page_url]
+    if len(candidates) > 1:
+        print(f"[*] {label}Cek {len(candidates)} format URL untuk chapter {chapter_num}")
+        statuses = await asyncio.gather(*(async_engine.probe(url) for url in candidates))
+        # Candidates that answered first; the rest are still tried if HEAD is not supported
+        candidates = ([url for url, status in zip(candidates, statuses) if status == 200]
+                      + [url for url, status in zip(candidates, statuses) if status != 200])
+
+    for url in candidates:
+        status, html = await async_engine.fetch(url, as_text=True)
+        if status == 200:
+            if url != chapter_url:
+                print(f"[+] {label}Chapter {chapter_num} ada di {url}")
+            return url, html
+    print(f"[!] {label}Gagal mengakses chapter {chapter_num} ({', '.join(candidates)})")
+    return None, None
+
+
+def get_manga_info(manga_url):
+    """Return (base_url, manga_name, total_chapters, sorted_chapters) for a series page.
+
+    Results are cached on disk: a fresh entry is returned without any request,
+    a stale one is revalidated with ETag/Last-Modified and only re-parsed when
+    the page actually changed.
+    """
+    entry = manga_cache.load(manga_url)
+    if entry and "chapter_urls" not in entry:
+        entry = None  # Cached before chapter URLs were kept; parse the page again
+    if entry and manga_cache.is_fresh(entry):
+        print(f"[+] Cache hit: {entry['manga_name']}")
+        return _manga_info_tuple(entry)
+
+    headers = manga_cache.conditional_headers(entry) if entry else {}
+    try:
+        resp = http_client.get(manga_url, headers=headers)
+    except Exception as e:
+        if entry:
+            print(f"[!] Gagal revalidasi {manga_url} ({e}), pakai cache lama")
+            return _manga_info_tuple(entry)
+        raise
+
+    if resp.status_code == 304 and entry:
+        manga_cache.touch(manga_url, entry)
+        print(f"[+] Cache revalidated (304): {entry['manga_name']}")
+        return _manga_info_tuple(entry)
 
-def download_chapter(chapter_url, chapter_num, OUTPUT_DIR, chat_id=None, user_cancel=None):
-    print(f"[*] Mengambil gambar dari {chapter_url}")
-    
-    # Coba akses URL asli dulu
-    resp = requests.get(chapter_url, headers={"User-Agent": "Mozilla/5.0"})
-    
-    # Jika gagal dan chapter adalah satuan (1-9), coba format dengan 0 di depan
     if resp.status_code != 200:
-        try:
-            # Cek apakah chapter_num adalah satuan tanpa 0 di depan
-            if str(chapter_num).isdigit() and 1 <= int(chapter_num) <= 9:
-                # Ubah URL untuk menggunakan format 01, 02, dst
-                alt_chapter_url = chapter_url.replace(f"-{chapter_num}/", f"-0{chapter_num}/")
-                print(f"[*] Mencoba format alternatif: {alt_chapter_url}")
-                
-                alt_resp = requests.get(alt_chapter_url, headers={"User-Agent": "Mozilla/5.0"})
-                if alt_resp.status_code == 200:
-                    resp = alt_resp
-                    chapter_url = alt_chapter_url
-                    print(f"[+] Berhasil dengan format 0{chapter_num}")
-                else:
-                    print(f"[!] Gagal mengakses kedua format untuk chapter {chapter_num}")
-                    return []
-            else:
-                print(f"[!] Gagal mengakses {chapter_url}")
-                return []
-        except:
-            print(f"[!] Gagal mengakses {chapter_url}")
-            return []
-
-    soup = BeautifulSoup(resp.text, "html.parser")
-    img_tags = soup.select("img")
-    img_urls = []
-
-    for img in img_tags:
-        src = img.get("src") or img.get("data-src")
-        if src and (src.endswith(".jpg") or src.endswith(".png")):
-            # Skip advertisement and non-content images
-            if "komikuplus" in src or "asset/img" in src:
-                continue
-            if not src.startswith("http"):
-                if src.startswith("//"):
-                    src = "https:" + src
-                elif src.startswith("/"):
-                    src = "https://komiku.org" + src
-                else:
-                    src = "https://" + src
-            img_urls.append(src)
+        return None, None, None, None
+
+    body_hash = hashlib.sha1(resp.content).hexdigest()
+    etag = resp.headers.get("ETag")
+    last_modified = resp.headers.get("Last-Modified")
+
+    if entry and entry.get("body_hash") == body_hash:
+        # Same page without validators: skip the parse, refresh the entry
+        entry = manga_cache.store(manga_url, entry, etag, last_modified, body_hash)
+        return _manga_info_tuple(entry)
+
+    info = _parse_manga_page(resp.text)
+    if not info:
+        return None, None, None, None
+
+    entry = manga_cache.store(manga_url, info, etag, last_modified, body_hash)
+    return _manga_info_tuple(entry)
+
+
+def _full_resolution(src):
+    """Try to get higher resolution image for BIG mode"""
+    # Replace common size indicators with larger versions
+    if "?resize=" in src:
+        return src.split("?resize=")[0]  # Remove resize parameter
+    if "thumb" in src:
+        return src.replace("thumb", "full")  # Replace thumb with full
+    if "_small" in src:
+        return src.replace("_small", "_large")  # Replace small with large
+    if "_medium" in src:
+        return src.replace("_medium", "_large")  # Replace medium with large
+    return src
+
+
+def chapter_image_urls(html, mode="normal", quiet=False):
+    """Page image URLs of a chapter page in download order, site header/footer images dropped"""
+    img_urls = extract_image_urls(html, KOMIKU_BASE_URL)
+    if mode == "big":
+        img_urls = [_full_resolution(src) for src in img_urls]
+        # Skip first 3 and last 1 images for komik mode
+        if len(img_urls) > 4:  # Only skip if we have more than 4 images
+            img_urls = img_urls[3:-1]  # Skip first 3 and last 1
+            if not quiet:
+                print(f"    > KOMIK MODE: Skipping first 3 and last 1 images. Processing {len(img_urls)} images.")
+        elif img_urls and not quiet:
+            print(f"    > KOMIK MODE: Too few images ({len(img_urls)}), not skipping any.")
+    else:
+        # Skip first 3 images only (keep last image for manga mode)
+        if len(img_urls) > 3:  # Only skip if we have more than 3 images
+            img_urls = img_urls[3:]  # Skip first 3 images only
+            if not quiet:
+                print(f"    > MANGA MODE: Skipping first 3 images. Processing {len(img_urls)} images.")
+        elif img_urls and not quiet:
+            print(f"    > Too few images ({len(img_urls)}), not skipping any.")
+    return img_urls
+
+
+async def _page_image_urls(chapter_url, chapter_num, mode, checkpoint=None, page_url=None, label=""):
+    """Page image URLs of a chapter: from the job checkpoint when resuming, else from its page"""
+    if checkpoint is not None and checkpoint.page_urls:
+        print(f"[*] {label}Melanjutkan chapter {chapter_num}: {checkpoint.pages_done} gambar sudah ada")
+        return checkpoint.page_urls
+
+    chapter_url, html = await _fetch_chapter_page(chapter_url, chapter_num, page_url, label)
+    if html is None:
+        return []
 
+    img_urls = chapter_image_urls(html, mode)
     if not img_urls:
         print(f"[!] Tidak ada gambar ditemukan di {chapter_url}")
         return []
+    if checkpoint is not None:
+        checkpoint.set_page_urls(img_urls)
+    return img_urls
 
-    # Skip first 3 images only (keep last image for manga mode)
-    if len(img_urls) > 3:  # Only skip if we have more than 3 images
-        img_urls = img_urls[3:]  # Skip first 3 images only
-        print(f"    > MANGA MODE: Skipping first 3 images. Processing {len(img_urls)} images.")
-    else:
-        print(f"    > Too few images ({len(img_urls)}), not skipping any.")
 
-    chapter_folder = os.path.join(OUTPUT_DIR, f"chapter-{chapter_num}")
+async def download_chapter_async(chapter_url, chapter_num, OUTPUT_DIR, chat_id=None, user_cancel=None, max_workers=None,
+                                 checkpoint=None, page_url=None):
+    chapter_folder = chapter_dir(OUTPUT_DIR, chapter_url, chapter_num)
+    slug = series_slug(chapter_url)
+    loop = asyncio.get_running_loop()
+
+    cached = await loop.run_in_executor(None, chapter_cache.get, slug, str(chapter_num), "normal", chapter_folder)
+    if cached:
+        print(f"[+] Chapter {chapter_num} diambil dari cache ({len(cached)} gambar)")
+        return cached
+
+    print(f"[*] Mengambil gambar dari {chapter_url}")
+    
+    img_urls = await _page_image_urls(chapter_url, chapter_num, "normal", checkpoint, page_url)
+    if not img_urls:
+        return []
+
     os.makedirs(chapter_folder, exist_ok=True)
 
-    images = []
-    for i, img_url in enumerate(img_urls, start=1):
-        # Check for cancellation
-        if user_cancel and chat_id and user_cancel.get(chat_id):
-            print(f"[!] Download cancelled for chapter {chapter_num}")
-            return []
-
-        try:
-            img_resp = requests.get(img_url, stream=True)
-            img = Image.open(BytesIO(img_resp.content)).convert("RGB")
-            img_path = os.path.join(chapter_folder, f"{i:03}.jpg")
-            img.save(img_path, "JPEG")
-            images.append(img_path)
-            print(f"    > Download gambar {i}/{len(img_urls)}")
-        except Exception as e:
-            print(f"    [!] Gagal download {img_url}: {e}")
+    images = await async_engine.fetch_images(
+        img_urls, chapter_folder, _store_image_normal,
+        is_cancelled=lambda: _is_cancelled(chat_id, user_cancel),
+        max_workers=max_workers or MAX_IMAGE_WORKERS,
+        checkpoint=checkpoint
+    )
+    if _is_cancelled(chat_id, user_cancel):
+        print(f"[!] Download cancelled for chapter {chapter_num}")
+        return []
+
+    # Only complete chapters are shared with later requests
+    if images and len(images) == len(img_urls):
+        if checkpoint is not None:
+            await loop.run_in_executor(None, checkpoint.complete, images)
+        await loop.run_in_executor(None, chapter_cache.put, slug, str(chapter_num), "normal", images)
 
     return images
 
-def download_chapter_big(chapter_url, chapter_num, OUTPUT_DIR, chat_id=None, user_cancel=None):
+async def download_chapter_big_async(chapter_url, chapter_num, OUTPUT_DIR, chat_id=None, user_cancel=None, max_workers=None,
+                                     checkpoint=None, page_url=None):
     """Download chapter with larger dimensions and higher quality images for /big mode"""
+    chapter_folder = chapter_dir(OUTPUT_DIR, chapter_url, chapter_num, "big")
+    slug = series_slug(chapter_url)
+    loop = asyncio.get_running_loop()
+
+    cached = await loop.run_in_executor(None, chapter_cache.get, slug, str(chapter_num), "big", chapter_folder)
+    if cached:
+        print(f"[+] BIG MODE: Chapter {chapter_num} diambil dari cache ({len(cached)} gambar)")
+        return cached
+
     print(f"[*] BIG MODE: Mengambil gambar dari {chapter_url}")
     
-    # Coba akses URL asli dulu
-    resp = requests.get(chapter_url, headers={"User-Agent": "Mozilla/5.0"})
-    
-    # Jika gagal dan chapter adalah satuan (1-9), coba format dengan 0 di depan
-    if resp.status_code != 200:
-        try:
-            # Cek apakah chapter_num adalah satuan tanpa 0 di depan
-            if str(chapter_num).isdigit() and 1 <= int(chapter_num) <= 9:
-                # Ubah URL untuk menggunakan format 01, 02, dst
-                alt_chapter_url = chapter_url.replace(f"-{chapter_num}/", f"-0{chapter_num}/")
-                print(f"[*] BIG MODE: Mencoba format alternatif: {alt_chapter_url}")
-                
-                alt_resp = requests.get(alt_chapter_url, headers={"User-Agent": "Mozilla/5.0"})
-                if alt_resp.status_code == 200:
-                    resp = alt_resp
-                    chapter_url = alt_chapter_url
-                    print(f"[+] BIG MODE: Berhasil dengan format 0{chapter_num}")
-                else:
-                    print(f"[!] BIG MODE: Gagal mengakses kedua format untuk chapter {chapter_num}")
-                    return []
-            else:
-                print(f"[!] Gagal mengakses {chapter_url}")
-                return []
-        except:
-            print(f"[!] Gagal mengakses {chapter_url}")
-            return []
-
-    soup = BeautifulSoup(resp.text, "html.parser")
-    img_tags = soup.select("img")
-    img_urls = []
-
-    for img in img_tags:
-        src = img.get("src") or img.get("data-src")
-        if src and (src.endswith(".jpg") or src.endswith(".png")):
-            # Skip advertisement and non-content images
-            if "komikuplus" in src or "asset/img" in src:
-                continue
-            if not src.startswith("http"):
-                if src.startswith("//"):
-                    src = "https:" + src
-                elif src.startswith("/"):
-                    src = "https://komiku.org" + src
-                else:
-                    src = "https://" + src
-
-            # Try to get higher resolution image for BIG mode
-            # Replace common size indicators with larger versions
-            if "?resize=" in src:
-                src = src.split("?resize=")[0]  # Remove resize parameter
-            elif "thumb" in src:
-                src = src.replace("thumb", "full")  # Replace thumb with full
-            elif "_small" in src:
-                src = src.replace("_small", "_large")  # Replace small with large
-            elif "_medium" in src:
-                src = src.replace("_medium", "_large")  # Replace medium with large
-
-            img_urls.append(src)
-
+    img_urls = await _page_image_urls(chapter_url, chapter_num, "big", checkpoint, page_url, label="BIG MODE: ")
     if not img_urls:
-        print(f"[!] Tidak ada gambar ditemukan di {chapter_url}")
         return []
 
-    # Skip first 3 and last 1 images for komik mode
-    if len(img_urls) > 4:  # Only skip if we have more than 4 images
-        img_urls = img_urls[3:-1]  # Skip first 3 and last 1
-        print(f"    > KOMIK MODE: Skipping first 3 and last 1 images. Processing {len(img_urls)} images.")
-    else:
-        print(f"    > KOMIK MODE: Too few images ({len(img_urls)}), not skipping any.")
-
-    chapter_folder = os.path.join(OUTPUT_DIR, f"chapter-{chapter_num}-big")
     os.makedirs(chapter_folder, exist_ok=True)
 
-    images = []
-    for i, img_url in enumerate(img_urls, start=1):
-        # Check for cancellation
-        if user_cancel and chat_id and user_cancel.get(chat_id):
-            print(f"[!] BIG MODE download cancelled for chapter {chapter_num}")
-            return []
-
-        try:
-            img_resp = requests.get(img_url, stream=True)
-            img = Image.open(BytesIO(img_resp.content))
-
-            # Get original dimensions
-            original_width, original_height = img.size
-
-            # Ensure consistent sizing for BIG mode
-            # Set minimum width for consistency
-            min_width = 1200
-            if original_width < min_width:
-                scale_factor = min_width / original_width
-                new_width = min_width
-                new_height = int(original_height * scale_factor)
-            else:
-                # For larger images, use 150% scaling
-                new_width = int(original_width * 1.5)
-                new_height = int(original_height * 1.5)
-
-            # Resize using high-quality resampling
-            img_resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-            # Convert to RGB if necessary
-            if img_resized.mode != "RGB":
-                img_resized = img_resized.convert("RGB")
-
-            img_path = os.path.join(chapter_folder, f"{i:03}.jpg")
-            # Save with maximum quality for BIG mode
-            img_resized.save(img_path, "JPEG", quality=100, optimize=False)
-            images.append(img_path)
-            print(f"    > BIG MODE: Download gambar {i}/{len(img_urls)} - Ukuran: {original_width}x{original_height} → {new_width}x{new_height}")
-        except Exception as e:
-            print(f"    [!] Gagal download {img_url}: {e}")
+    # Resize/encode goes to the process pool as soon as each page arrives
+    images = await async_engine.fetch_images(
+        img_urls, chapter_folder, transcode_big,
+        is_cancelled=lambda: _is_cancelled(chat_id, user_cancel),
+        max_workers=max_workers or MAX_IMAGE_WORKERS,
+        label="BIG MODE: ",
+        executor=transcode.get_pool(),
+        checkpoint=checkpoint
+    )
+    if _is_cancelled(chat_id, user_cancel):
+        print(f"[!] BIG MODE download cancelled for chapter {chapter_num}")
+        return []
+
+    if images and len(images) == len(img_urls):
+        if checkpoint is not None:
+            await loop.run_in_executor(None, checkpoint.complete, images)
+        await loop.run_in_executor(None, chapter_cache.put, slug, str(chapter_num), "big", images)
 
     return images
 
-def create_pdf(all_images, output_pdf):
+
+def download_chapter(chapter_url, chapter_num, OUTPUT_DIR, chat_id=None, user_cancel=None, max_workers=None,
+                     checkpoint=None, page_url=None):
+    """Sync wrapper around download_chapter_async, runs on the shared async engine"""
+    return async_engine.run_sync(
+        download_chapter_async(chapter_url, chapter_num, OUTPUT_DIR, chat_id, user_cancel, max_workers, checkpoint,
+                               page_url)
+    )
+
+
+def download_chapter_big(chapter_url, chapter_num, OUTPUT_DIR, chat_id=None, user_cancel=None, max_workers=None,
+                         checkpoint=None, page_url=None):
+    """Sync wrapper around download_chapter_big_async, runs on the shared async engine"""
+    return async_engine.run_sync(
+        download_chapter_big_async(chapter_url, chapter_num, OUTPUT_DIR, chat_id, user_cancel, max_workers, checkpoint,
+                                   page_url)
+    )
+
+def _page_encoder(all_images, max_bytes=None):
+    return TargetSizeEncoder(
+        all_images, max_bytes,
+        max_quality=PDF_JPEG_QUALITY,
+        min_quality=PDF_MIN_QUALITY,
+        max_pixels=PDF_MAX_PIXELS,
+        page_overhead=PDF_PAGE_OVERHEAD,
+        file_overhead=PDF_FILE_OVERHEAD
+    )
+
+
+def create_pdf(all_images, output_pdf, max_bytes=PDF_PART_MAX_BYTES):
+    """Build one PDF from page images, aiming to stay under max_bytes (None = no target)"""
+    with metrics.timed("create_pdf") as stage:
+        _create_pdf(all_images, output_pdf, max_bytes)
+        if os.path.exists(output_pdf):
+            stage.add_bytes(os.path.getsize(output_pdf))
+        else:
+            stage.fail()
+
+
+def _create_pdf(all_images, output_pdf, max_bytes):
     if not all_images:
         print("[!] Tidak ada gambar untuk dibuat PDF.")
         return
 
     try:
-        # Process images in smaller batches to save memory
-        batch_size = 10
-        first_image = None
-        processed_images = []
-
-        for i in range(0, len(all_images), batch_size):
-            batch = all_images[i:i + batch_size]
-            batch_processed = []
-
-            for img_path in batch:
+        # Quality/scale are chosen up front from a sample of pages so the
+        # output lands near max_bytes without re-encoding everything twice
+        encoder = _page_encoder(all_images, max_bytes)
+        encoder.plan()
+
+        # Pages are streamed to disk one at a time, so memory stays flat
+        # regardless of how many chapters are merged
+        with StreamingPDFWriter(output_pdf) as writer:
+            for img_path in all_images:
                 try:
-                    img = Image.open(img_path).convert("RGB")
-                    # Optimize image size if too large (reduce quality for very large images)
-                    width, height = img.size
-                    if width * height > 4000000:  # If image is very large (>4MP)
-                        # Reduce size by 20%
-                        new_width = int(width * 0.8)
-                        new_height = int(height * 0.8)
-                        img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-                    if first_image is None:
-                        first_image = img
-                    else:
-                        batch_processed.append(img)
-
+                    writer.add_jpeg(*encoder.encode(img_path))
                 except Exception as e:
                     print(f"[!] Error processing {img_path}: {e}")
                     continue
+            page_count = writer.page_count
 
-            processed_images.extend(batch_processed)
-
-        if first_image:
-            # Save with optimization
-            first_image.save(
-                output_pdf, 
-                save_all=True, 
-                append_images=processed_images,
-                optimize=True,
-                quality=85  # Slightly reduce quality to save space
-            )
-            print(f"[+] PDF dibuat: {output_pdf}")
+        if page_count:
+            print(f"[+] PDF dibuat: {output_pdf} ({page_count} halaman)")
 
             # Check final file size
             file_size = os.path.getsize(output_pdf)
             print(f"[+] Ukuran PDF: {file_size/(1024*1024):.1f}MB")
 
-            if file_size > 45 * 1024 * 1024:  # Warn if close to 50MB limit
-                print(f"[!] Warning: PDF mendekati batas ukuran Telegram (45MB+)")
+            if max_bytes and file_size > max_bytes:
+                print(f"[!] Warning: PDF melebihi target {max_bytes/(1024*1024):.1f}MB")
         else:
+            os.remove(output_pdf)
             print("[!] Tidak ada gambar yang bisa diproses untuk PDF.")
 
     except Exception as e:
+        # The writer already removed its partial file; no truncated fallback PDF
         print(f"[!] Error creating PDF: {e}")
-        # Try fallback method with lower quality
-        try:
-            pil_images = []
-            for img_path in all_images[:20]:  # Limit to first 20 images as fallback
+
+
+def part_path(output_pdf, number):
+    stem, ext = os.path.splitext(output_pdf)
+    return f"{stem} part {number}{ext}"
+
+
+def _projected_size(writer, extra=0):
+    """Final file size if extra more bytes of pages were added and the part closed now"""
+    return writer.bytes_written + extra + writer.page_count * PDF_PAGE_OVERHEAD + PDF_FILE_OVERHEAD
+
+
+def create_pdf_parts(chapter_images, output_pdf, max_bytes=PDF_PART_MAX_BYTES):
+    """Build a merged PDF as one or more parts, each under max_bytes.
+
+    chapter_images is [(chapter, [image paths]), ...]. Each chapter is written
+    into the current part; if it overflows there, the part is rolled back to
+    where the chapter started and the chapter goes whole into a new part, so
+    parts are cut between chapters and filled by what the encoder actually
+    wrote. A chapter too big for a part of its own is cut between pages.
+    Returns [(path, [chapters])]; a single part is written to output_pdf.
+    """
+    with metrics.timed("create_pdf") as stage:
+        parts = _create_pdf_parts(chapter_images, output_pdf, max_bytes)
+        if parts:
+            stage.add_bytes(sum(os.path.getsize(path) for path, _ in parts))
+        else:
+            stage.fail()
+    return parts
+
+
+def _create_pdf_parts(chapter_images, output_pdf, max_bytes):
+    parts = []
+    writer = None
+    part_chapters = []
+    # Parts handle the size limit, so pages keep full quality (caps only)
+    encoder = _page_encoder([path for _, images in chapter_images for path in images])
+
+    def close_part():
+        if writer.page_count:
+            writer.close()
+            parts.append((writer.path, part_chapters))
+            print(f"[+] PDF part {len(parts)} dibuat: {writer.path} "
+                  f"({writer.page_count} halaman, {os.path.getsize(writer.path)/(1024*1024):.1f}MB)")
+        else:
+            writer.abort()
+
+    try:
+        for chapter, images in chapter_images:
+            # Where the chapter starts in a part that already holds earlier chapters
+            start = writer.mark() if writer is not None and writer.page_count else None
+            chapter_bytes = 0
+            written = []
+            pending = list(images)
+            while pending:
+                img_path = pending.pop(0)
                 try:
-                    img = Image.open(img_path).convert("RGB")
-                    # Reduce size significantly for fallback
-                    width, height = img.size
-                    new_width = int(width * 0.6)
-                    new_height = int(height * 0.6)
-                    img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                    pil_images.append(img)
-                except:
+                    page = encoder.encode(img_path)
+                except Exception as e:
+                    print(f"[!] Error processing {img_path}: {e}")
                     continue
+                page_bytes = len(page[0]) + PDF_PAGE_OVERHEAD
+
+                if writer is not None and writer.page_count and _projected_size(writer, len(page[0])) > max_bytes:
+                    if start is not None and chapter_bytes + page_bytes + PDF_FILE_OVERHEAD <= max_bytes:
+                        # Cut before this chapter: the part ends with the previous
+                        # one and the chapter is written again into a fresh part
+                        writer.rollback(start)
+                        if part_chapters and part_chapters[-1] == chapter:
+                            part_chapters.pop()
+                        pending = written + [img_path] + pending
+                        start = None
+                        chapter_bytes = 0
+                        written = []
+                        close_part()
+                        writer = None
+                        continue
+                    # Chapter bigger than a whole part: cut between pages
+                    close_part()
+                    writer = None
+                if writer is None:
+                    writer = StreamingPDFWriter(part_path(output_pdf, len(parts) + 1))
+                    part_chapters = []
+
+                writer.add_jpeg(*page)
+                chapter_bytes += page_bytes
+                written.append(img_path)
+                if chapter not in part_chapters:
+                    part_chapters.append(chapter)
+
+        if writer is not None:
+            close_part()
+    except Exception as e:
+        print(f"[!] Error creating PDF parts: {e}")
+        if writer is not None:
+            writer.abort()
+        for path, _ in parts:
+            if os.path.exists(path):
+                os.remove(path)
+        return []
 
-            if pil_images:
-                pil_images[0].save(
-                    output_pdf, 
-                    save_all=True, 
-                    append_images=pil_images[1:],
-                    optimize=True,
-                    quality=70
-                )
-                print(f"[+] PDF fallback dibuat: {output_pdf}")
-
-        except Exception as fallback_error:
-            print(f"[!] Fallback PDF creation failed: {fallback_error}")
\ No newline at end of file
+    if len(parts) == 1:
+        # Fits in one file: keep the plain name
+        os.replace(parts[0][0], output_pdf)
+        parts = [(output_pdf, parts[0][1])]
+    return parts
@@ -0,0 +1,125 @@
+import os
+import re
+from html.parser import HTMLParser
+
+# Single-pass extraction of the few things the bot needs from Komiku HTML:
+# chapter links on a series page and reader image sources on a chapter page.
+# Nothing builds a document tree: the page is fed to a tokenizer in chunks and
+# a callback keeps the attributes of <a>/<img> start tags. lxml's C tokenizer
+# is used when installed, otherwise the stdlib HTMLParser.
+
+try:
+    from lxml import etree
+except ImportError:  # Pure-Python tokenizer fallback
+    etree = None
+
+# "lxml", "html.parser" or "auto" (lxml when installed)
+EXTRACTOR_BACKEND = os.getenv("EXTRACTOR_BACKEND", "auto")
+
+# Image sources that are ads or site chrome, not reader pages
+AD_SOURCE_MARKERS = ("komikuplus", "asset/img")
+_AD_SOURCE = re.compile("|".join(re.escape(marker) for marker in AD_SOURCE_MARKERS))
+
+PAGE_IMAGE_SUFFIXES = (".jpg", ".png")
+
+# Characters handed to the tokenizer per feed() call
+FEED_CHUNK = 64 * 1024
+
+
+def _use_lxml():
+    if EXTRACTOR_BACKEND == "html.parser":
+        return False
+    if EXTRACTOR_BACKEND == "lxml" and etree is None:
+        raise ImportError("EXTRACTOR_BACKEND=lxml but lxml is not installed")
+    return etree is not None
+
+
+class _TagCollector(HTMLParser):
+    """Tokenizer that hands attributes of one tag name to a callback"""
+
+    def __init__(self, tag, on_tag):
+        super().__init__(convert_charrefs=False)
+        self._tag = tag
+        self._on_tag = on_tag
+
+    def handle_starttag(self, tag, attrs):
+        if tag == self._tag:
+            self._on_tag(dict(attrs))
+
+    handle_startendtag = handle_starttag
+
+
+class _TagTarget:
+    """lxml parser target: gets tokenizer callbacks instead of lxml building a tree"""
+
+    def __init__(self, tag, on_tag):
+        self._tag = tag
+        self._on_tag = on_tag
+
+    def start(self, tag, attrib):
+        if tag == self._tag:
+            self._on_tag(dict(attrib))
+
+    def end(self, tag):
+        pass
+
+    def data(self, data):
+        pass
+
+    def close(self):
+        return None
+
+
+def _iter_tag_attrs(html, tag):
+    """Yield the attribute dict of every <tag> start tag in document order"""
+    found = []
+    if _use_lxml():
+        parser = etree.HTMLParser(target=_TagTarget(tag, found.append))
+    else:
+        parser = _TagCollector(tag, found.append)
+    for offset in range(0, len(html), FEED_CHUNK):
+        parser.feed(html[offset:offset + FEED_CHUNK])
+        # Tags completed by this chunk, handed out before the next one is read
+        yield from found
+        found.clear()
+    parser.close()
+    yield from found
+
+
+def extract_chapter_links(html):
+    """hrefs of <a> tags whose href contains 'chapter', in page order"""
+    links = []
+    for attrs in _iter_tag_attrs(html, "a"):
+        href = attrs.get("href")
+        if href and "chapter" in href:
+            links.append(href)
+    return links
+
+
+def is_ad_source(src):
+    return _AD_SOURCE.search(src) is not None
+
+
+def absolute_url(src, base_url):
+    """Make a reader image src absolute the way the site serves it"""
+    if src.startswith("http"):
+        return src
+    if src.startswith("//"):
+        return "https:" + src
+    if src.startswith("/"):
+        return base_url.rstrip("/") + src
+    return "https://" + src
+
+
+def extract_image_urls(html, base_url):
+    """Absolute URLs of reader page images (.jpg/.png), ads and site chrome skipped"""
+    urls = []
+    for attrs in _iter_tag_attrs(html, "img"):
+        src = attrs.get("src") or attrs.get("data-src")
+        if not src or not src.endswith(PAGE_IMAGE_SUFFIXES):
+            continue
+        # Skip advertisement and non-content images
+        if is_ad_source(src):
+            continue
+        urls.append(absolute_url(src, base_url))
+    return urls
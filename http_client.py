@@ -0,0 +1,72 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# Shared HTTP client for scraping, CDN and GoFile traffic.
+# One pooled session keeps TCP/TLS connections alive between requests
+# instead of paying a fresh handshake for every page image.
+
+USER_AGENT = os.getenv(
+    "HTTP_USER_AGENT",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
+
+# (connect, read) timeout applied when a call site doesn't pass its own
+DEFAULT_TIMEOUT = (10, 60)
+
+# Connections kept per host for hosts without an explicit entry below
+DEFAULT_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+
+# Per-host pool sizes: HTML pages are fetched one at a time, images fan out
+HOST_POOL_SIZES = {
+    "https://komiku.org/": 4,
+    "https://api.gofile.io/": 2,
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class PooledSession(requests.Session):
+    """requests.Session with a default timeout and a consistent User-Agent"""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+        self.headers.update({
+            "User-Agent": USER_AGENT,
+            "Connection": "keep-alive",
+        })
+
+        default_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=DEFAULT_POOL_SIZE)
+        self.mount("https://", default_adapter)
+        self.mount("http://", default_adapter)
+        for prefix, pool_size in HOST_POOL_SIZES.items():
+            self.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def get_session():
+    """Return the process-wide pooled session, creating it on first use"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = PooledSession()
+    return _session
+
+
+def get(url, **kwargs):
+    return get_session().get(url, **kwargs)
+
+
+def head(url, **kwargs):
+    return get_session().head(url, **kwargs)
+
+
+def post(url, **kwargs):
+    return get_session().post(url, **kwargs)
@@ -0,0 +1,84 @@
+# Helpers for looking at page images without decoding them with PIL
+
+# SOF markers that carry frame size; C4 (DHT), C8 (JPG) and CC (DAC) are not frames
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_PROGRESSIVE_MARKERS = {0xC2, 0xC6, 0xCA, 0xCE}
+# Markers without a length field
+_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+
+
+def sniff_format(data):
+    """Guess the image format from its magic bytes ('jpeg', 'png', 'webp', 'gif' or None)"""
+    if data[:3] == b"\xff\xd8\xff":
+        return "jpeg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    return None
+
+
+def is_passthrough_jpeg(data):
+    """True if data is a baseline 8-bit RGB/grayscale JPEG that can be stored as-is"""
+    if sniff_format(data) != "jpeg":
+        return False
+    info = jpeg_info(data)
+    return bool(info and info["baseline"] and info["bits"] == 8 and info["components"] in (1, 3))
+
+
+def jpeg_info(data):
+    """Parse the JPEG frame header from raw bytes.
+
+    Returns a dict with width, height, components, bits, baseline and
+    progressive, or None if data is not a readable JPEG.
+    """
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+
+    pos = 2
+    size = len(data)
+    while pos < size:
+        # Skip to the next marker, ignoring fill bytes
+        if data[pos] != 0xFF:
+            return None
+        while pos < size and data[pos] == 0xFF:
+            pos += 1
+        if pos >= size:
+            return None
+        marker = data[pos]
+        pos += 1
+
+        if marker in _STANDALONE_MARKERS:
+            continue
+        if marker == 0xD9 or marker == 0xDA:
+            # End of image / start of scan before any frame header
+            return None
+        if pos + 2 > size:
+            return None
+        length = (data[pos] << 8) | data[pos + 1]
+        if length < 2:
+            return None
+
+        if marker in _SOF_MARKERS:
+            if pos + 8 > size:
+                return None
+            bits = data[pos + 2]
+            height = (data[pos + 3] << 8) | data[pos + 4]
+            width = (data[pos + 5] << 8) | data[pos + 6]
+            components = data[pos + 7]
+            if not width or not height:
+                return None
+            return {
+                "width": width,
+                "height": height,
+                "components": components,
+                "bits": bits,
+                "baseline": marker in (0xC0, 0xC1),
+                "progressive": marker in _PROGRESSIVE_MARKERS,
+            }
+
+        pos += length
+
+    return None
@@ -0,0 +1,234 @@
+import os
+import time
+import uuid
+import threading
+from cache import CACHE_DIR, read_json, write_json_atomic, file_sha256
+
+# Checkpoints for download jobs, so a job survives a bot restart.
+# A manifest is written when a job is queued and updated as it makes
+# progress: page URLs and verified page files per chapter, chapters already
+# sent, and the parts a merged PDF was split into. It is deleted when the job
+# ends (done, cancelled or failed); whatever is left on startup is resumed.
+
+JOB_MANIFEST_DIR = os.getenv("JOB_MANIFEST_DIR", os.path.join(CACHE_DIR, "jobs"))
+
+# Finished pages are written to the manifest in batches: after this many
+# pages or seconds, and when a chapter completes. A crash loses at most one
+# batch, whose pages are fetched again on resume.
+CHECKPOINT_PAGES = int(os.getenv("CHECKPOINT_PAGES", "10"))
+CHECKPOINT_SECONDS = float(os.getenv("CHECKPOINT_SECONDS", "5"))
+
+# Session keys a job needs to run again after a restart
+JOB_STATE_KEYS = ("base_url", "manga_name", "awal", "akhir", "mode", "chapters_to_download", "chapter_urls")
+
+
+class ChapterCheckpoint:
+    """Progress of one chapter of a job: its page URLs and the page files already stored.
+
+    Pages are recorded with their size as they land and hashed once, when
+    the whole chapter is stored (complete()).
+    """
+
+    def __init__(self, manifest, chapter):
+        self._manifest = manifest
+        self.chapter = str(chapter)
+
+    def _entry(self):
+        return self._manifest._chapter_entry(self.chapter)
+
+    @property
+    def page_urls(self):
+        with self._manifest._lock:
+            return list(self._entry().get("pages") or [])
+
+    def set_page_urls(self, urls):
+        with self._manifest._lock:
+            self._entry()["pages"] = list(urls)
+            self._manifest._save_locked()
+
+    @property
+    def pages_done(self):
+        with self._manifest._lock:
+            return len(self._entry().get("done", {}))
+
+    def verified_page(self, path):
+        """True if path was recorded as finished and still has the recorded size (and hash, once known)"""
+        name = os.path.basename(path)
+        with self._manifest._lock:
+            item = self._entry().get("done", {}).get(name)
+        if not item:
+            return False
+        try:
+            if os.path.getsize(path) != item["size"]:
+                return False
+            return "sha256" not in item or file_sha256(path) == item["sha256"]
+        except OSError:
+            return False
+
+    def record_page(self, path):
+        """Page stored (renamed into place, so it is whole); written out with the next batch"""
+        item = {"size": os.path.getsize(path)}
+        with self._manifest._lock:
+            self._entry().setdefault("done", {})[os.path.basename(path)] = item
+            self._manifest._save_batched_locked()
+
+    def complete(self, paths):
+        """All pages of the chapter are stored: hash them once and write the checkpoint"""
+        items = {os.path.basename(path): {"size": os.path.getsize(path), "sha256": file_sha256(path)}
+                 for path in paths}
+        with self._manifest._lock:
+            self._entry().setdefault("done", {}).update(items)
+            self._manifest._save_locked()
+
+
+class JobManifest:
+    def __init__(self, store, path, data):
+        self._store = store
+        self.path = path
+        self._data = data
+        self._lock = threading.Lock()
+        self._finished = False
+        # Page records not written yet, and when the file was last written
+        self._unsaved = 0
+        self._saved_at = time.monotonic()
+
+    @property
+    def id(self):
+        return self._data["id"]
+
+    @property
+    def chat_id(self):
+        return self._data["chat_id"]
+
+    @property
+    def mode(self):
+        """Callback mode of the job: gabung, pisah, gofile_gabung or gofile_pisah"""
+        return self._data["mode"]
+
+    @property
+    def state(self):
+        """Session fields of the job, plus its job_id (names the job's working folder)"""
+        return dict(self._data["state"], job_id=self.id)
+
+    def _chapter_entry(self, chapter):
+        return self._data["chapters"].setdefault(chapter, {})
+
+    def _save_locked(self):
+        if self._finished:
+            return
+        self._unsaved = 0
+        self._saved_at = time.monotonic()
+        self._data["updated_at"] = time.time()
+        try:
+            write_json_atomic(self.path, self._data)
+        except OSError as e:
+            print(f"[!] Gagal menyimpan manifest job {self.id}: {e}")
+
+    def _save_batched_locked(self):
+        self._unsaved += 1
+        if self._unsaved >= CHECKPOINT_PAGES or time.monotonic() - self._saved_at >= CHECKPOINT_SECONDS:
+            self._save_locked()
+
+    def chapter(self, chapter):
+        return ChapterCheckpoint(self, chapter)
+
+    def is_sent(self, chapter):
+        with self._lock:
+            return bool(self._data["chapters"].get(str(chapter), {}).get("sent"))
+
+    def mark_sent(self, chapter):
+        with self._lock:
+            self._chapter_entry(str(chapter))["sent"] = True
+            self._save_locked()
+
+    def parts(self):
+        """[(path, chapters, sent)] of the merged PDF parts, [] until they are built"""
+        with self._lock:
+            return [(p["path"], list(p["chapters"]), p.get("sent", False)) for p in self._data.get("parts", [])]
+
+    def set_parts(self, parts):
+        """Record built parts [(path, chapters)], keeping the sent flag of parts that did not change"""
+        with self._lock:
+            sent = {(p["path"], tuple(p["chapters"])) for p in self._data.get("parts", []) if p.get("sent")}
+            self._data["parts"] = [
+                {"path": path, "chapters": list(chapters), "sent": (path, tuple(chapters)) in sent}
+                for path, chapters in parts
+            ]
+            self._save_locked()
+
+    def mark_part_sent(self, path):
+        with self._lock:
+            for part in self._data.get("parts", []):
+                if part["path"] == path:
+                    part["sent"] = True
+            self._save_locked()
+
+    def finish(self):
+        """The job ended (done, cancelled or failed): drop its checkpoint"""
+        with self._lock:
+            self._finished = True
+        self._store._forget(self)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class JobManifestStore:
+    def __init__(self, directory=JOB_MANIFEST_DIR):
+        self.directory = directory
+        # One object per manifest file, shared by the job and by cleanup/cancel
+        self._manifests = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _forget(self, manifest):
+        with self._lock:
+            self._manifests.pop(manifest.id, None)
+
+    def create(self, chat_id, mode, job_state):
+        job_id = uuid.uuid4().hex[:12]
+        data = {
+            "id": job_id,
+            "chat_id": chat_id,
+            "mode": mode,
+            "state": {key: job_state.get(key) for key in JOB_STATE_KEYS},
+            "chapters": {},
+            "parts": [],
+            "created_at": time.time(),
+        }
+        manifest = JobManifest(self, os.path.join(self.directory, f"{job_id}.json"), data)
+        with manifest._lock:
+            manifest._save_locked()
+        with self._lock:
+            self._manifests[job_id] = manifest
+        return manifest
+
+    def unfinished(self):
+        """Manifests of jobs not finished yet (queued, running, or left by a previous run), oldest first"""
+        with self._lock:
+            for name in os.listdir(self.directory):
+                job_id, ext = os.path.splitext(name)
+                if ext != ".json" or job_id in self._manifests:
+                    continue
+                path = os.path.join(self.directory, name)
+                data = read_json(path)
+                if not data or "state" not in data:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                self._manifests[job_id] = JobManifest(self, path, data)
+            manifests = list(self._manifests.values())
+        manifests.sort(key=lambda m: m._data.get("created_at", 0))
+        return manifests
+
+    def discard_user(self, chat_id):
+        """Drop the manifests of a user's jobs (e.g. after /cancel)"""
+        for manifest in self.unfinished():
+            if manifest.chat_id == chat_id:
+                manifest.finish()
+
+
+job_manifests = JobManifestStore()
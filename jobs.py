@@ -0,0 +1,223 @@
+import os
+import time
+import itertools
+import threading
+from collections import deque
+import metrics
+
+# Download job scheduler. Telegram handlers only enqueue a Job; a fixed pool
+# of worker threads runs them, so the polling threads stay responsive and the
+# number of concurrent downloads is bounded.
+
+# Jobs running at the same time across all users
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Jobs one user may have running at the same time
+JOB_MAX_ACTIVE_PER_USER = int(os.getenv("JOB_MAX_ACTIVE_PER_USER", "1"))
+# Jobs one user may have waiting + running
+JOB_MAX_PENDING_PER_USER = int(os.getenv("JOB_MAX_PENDING_PER_USER", "3"))
+# Per-mode concurrency limits, e.g. "big=1,normal=2"
+JOB_MODE_LIMITS = os.getenv("JOB_MODE_LIMITS", "big=1")
+
+# Starting guess for job duration (seconds) until real timings are known
+DEFAULT_JOB_SECONDS = {"normal": 90, "big": 240}
+
+
+def _parse_mode_limits(value):
+    limits = {}
+    for part in value.split(","):
+        if "=" in part:
+            mode, limit = part.split("=", 1)
+            try:
+                limits[mode.strip()] = int(limit)
+            except ValueError:
+                continue
+    return limits
+
+
+class JobLimitError(Exception):
+    """Raised when a user already has too many jobs queued"""
+
+
+class Job:
+    _ids = itertools.count(1)
+
+    def __init__(self, chat_id, mode, run, description="", units=1):
+        self.id = next(Job._ids)
+        self.chat_id = chat_id
+        self.mode = mode
+        self.run = run
+        self.description = description
+        # Rough size of the job (e.g. chapter count) used for ETA
+        self.units = max(1, units)
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.status = "queued"
+
+
+class JobScheduler:
+    def __init__(self, workers=JOB_WORKERS, max_active_per_user=JOB_MAX_ACTIVE_PER_USER,
+                 max_pending_per_user=JOB_MAX_PENDING_PER_USER, mode_limits=None):
+        self.workers = max(1, workers)
+        self.max_active_per_user = max(1, max_active_per_user)
+        self.max_pending_per_user = max(1, max_pending_per_user)
+        self.mode_limits = mode_limits if mode_limits is not None else _parse_mode_limits(JOB_MODE_LIMITS)
+
+        self._queue = deque()
+        self._active = {}
+        self._cond = threading.Condition()
+        self._threads = []
+        # Moving average of seconds per unit, per mode
+        self._unit_seconds = {mode: seconds for mode, seconds in DEFAULT_JOB_SECONDS.items()}
+
+    # -------------------- Public API --------------------
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker_loop, name=f"JobWorker-{i + 1}")
+                t.daemon = True
+                t.start()
+                self._threads.append(t)
+        print(f"🧵 Job scheduler started with {self.workers} workers")
+
+    def submit(self, job):
+        """Queue a job; returns (position, eta_seconds). Position 0 means it starts now."""
+        self.start()
+        with self._cond:
+            pending = sum(1 for j in self._queue if j.chat_id == job.chat_id)
+            pending += sum(1 for j in self._active.values() if j.chat_id == job.chat_id)
+            if pending >= self.max_pending_per_user:
+                raise JobLimitError(f"User {job.chat_id} already has {pending} jobs")
+
+            self._queue.append(job)
+            position = self._position_locked(job)
+            eta = self._eta_locked(job)
+            self._cond.notify_all()
+        print(f"📋 Job #{job.id} queued for {job.chat_id} ({job.mode}, {job.description}) pos={position}")
+        return position, eta
+
+    def cancel_user(self, chat_id):
+        """Drop queued (not yet running) jobs of a user; returns how many were removed"""
+        with self._cond:
+            removed = [j for j in self._queue if j.chat_id == chat_id]
+            for job in removed:
+                self._queue.remove(job)
+                job.status = "cancelled"
+            self._cond.notify_all()
+        return len(removed)
+
+    def position(self, job):
+        with self._cond:
+            return self._position_locked(job)
+
+    @property
+    def queue_depth(self):
+        with self._cond:
+            return len(self._queue)
+
+    @property
+    def active_jobs(self):
+        with self._cond:
+            return len(self._active)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "queued": len(self._queue),
+                "active": len(self._active),
+                "active_by_mode": self._count_by_mode(self._active.values()),
+            }
+
+    # -------------------- Internals --------------------
+    @staticmethod
+    def _count_by_mode(jobs):
+        counts = {}
+        for job in jobs:
+            counts[job.mode] = counts.get(job.mode, 0) + 1
+        return counts
+
+    def _can_start(self, job, active_by_user, active_by_mode):
+        if active_by_user.get(job.chat_id, 0) >= self.max_active_per_user:
+            return False
+        limit = self.mode_limits.get(job.mode)
+        if limit is not None and active_by_mode.get(job.mode, 0) >= limit:
+            return False
+        return True
+
+    def _next_runnable_locked(self):
+        active_by_user = {}
+        for job in self._active.values():
+            active_by_user[job.chat_id] = active_by_user.get(job.chat_id, 0) + 1
+        active_by_mode = self._count_by_mode(self._active.values())
+
+        for job in self._queue:
+            if self._can_start(job, active_by_user, active_by_mode):
+                return job
+        return None
+
+    def _position_locked(self, job):
+        if job.status != "queued":
+            return 0
+        ahead = 0
+        for queued in self._queue:
+            if queued is job:
+                break
+            ahead += 1
+        # Free worker and no limit in the way: starts right away
+        if ahead == 0 and len(self._active) < self.workers and self._next_runnable_locked() is job:
+            return 0
+        return ahead + 1
+
+    def _job_seconds(self, job):
+        return self._unit_seconds.get(job.mode, DEFAULT_JOB_SECONDS["normal"]) * job.units
+
+    def _eta_locked(self, job):
+        now = time.time()
+        # Remaining time of running jobs plus everything queued ahead, spread over the workers
+        busy = sum(max(0.0, self._job_seconds(j) - (now - j.started_at)) for j in self._active.values())
+        for queued in self._queue:
+            if queued is job:
+                break
+            busy += self._job_seconds(queued)
+        if len(self._active) < self.workers and busy == 0:
+            return 0
+        return int(busy / self.workers)
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                job = self._next_runnable_locked()
+                while job is None or len(self._active) >= self.workers:
+                    self._cond.wait()
+                    job = self._next_runnable_locked()
+                self._queue.remove(job)
+                job.status = "running"
+                job.started_at = time.time()
+                self._active[job.id] = job
+
+            try:
+                job.run()
+                job.status = "done"
+            except Exception as e:
+                job.status = "failed"
+                print(f"❌ Job #{job.id} failed: {e}")
+            finally:
+                job.finished_at = time.time()
+                metrics.JOBS_FINISHED.inc(mode=job.mode, status=job.status)
+                with self._cond:
+                    self._active.pop(job.id, None)
+                    self._record_duration(job)
+                    self._cond.notify_all()
+
+    def _record_duration(self, job):
+        per_unit = (job.finished_at - job.started_at) / job.units
+        previous = self._unit_seconds.get(job.mode, per_unit)
+        self._unit_seconds[job.mode] = previous * 0.7 + per_unit * 0.3
+
+
+scheduler = JobScheduler()
+metrics.JOB_QUEUE_DEPTH.set_function(lambda: scheduler.queue_depth)
+metrics.ACTIVE_JOBS.set_function(lambda: scheduler.active_jobs)
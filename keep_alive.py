@@ -1,7 +1,8 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify
 from threading import Thread
 import time
 import os
+import metrics
 
 app = Flask(__name__)
 start_time = time.time()
@@ -20,6 +21,10 @@ def health():
         "timestamp": int(time.time())
     })
 
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route('/ping')
 def ping():
     return "pong"
@@ -1,11 +1,20 @@
 import os
 import shutil
-import requests
-from bs4 import BeautifulSoup
+import http_client
+import metrics
+import transcode
 import telebot
 from telebot import types
-from downloader import download_chapter, create_pdf, download_chapter_big
+from downloader import download_chapter, create_pdf, create_pdf_parts, download_chapter_big, get_manga_info, pdf_settings
+from downloader import chapter_image_urls, chapter_page_urls, chapter_dir
+from downloader import PDF_PART_MAX_BYTES
+from chapter_index import ChapterIndex, chapter_number
+from cache import pdf_cache, chapter_cache, file_id_index, artifact_key, series_slug
+from prefetch import prefetcher
 from keep_alive import keep_alive
+from pipeline import run_pipeline
+from jobs import Job, JobLimitError, scheduler
+from job_manifest import job_manifests
 # Removed: from google_drive_uploader import GoogleDriveUploader
 import time
 import threading
@@ -16,6 +25,7 @@ import platform
 # Import the real GoFile uploader
 from uploader import GoFileUploader
 
+# Store discovery is lazy; refresh_async() at startup warms it in the background
 file_uploader = GoFileUploader()
 
 
@@ -41,11 +51,32 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 # Removed: drive_uploader = GoogleDriveUploader()
 # Removed: print("✅ Google Drive uploader initialized")
 
+def job_output_dir(job_state):
+    """Working folder of one job; chapter pages of concurrent jobs never share a folder"""
+    return os.path.join(OUTPUT_DIR, f"job-{job_state['job_id']}")
+
+def in_flight_files():
+    """Names under OUTPUT_DIR that unfinished jobs still need (job folders, PDFs)"""
+    names = set()
+    for manifest in job_manifests.unfinished():
+        state = manifest.state
+        names.add(os.path.basename(job_output_dir(state)))
+        for ch in state.get("chapters_to_download") or []:
+            names.add(f"{state.get('manga_name')} chapter {ch}.pdf")
+        names.add(f"{state.get('manga_name')} chapter {state.get('awal')}-{state.get('akhir')}.pdf")
+        for part_path, _, _ in manifest.parts():
+            names.add(os.path.basename(part_path))
+    return names
+
 # Clean up downloads folder on startup
 def cleanup_downloads():
     try:
         if os.path.exists(OUTPUT_DIR):
+            # Jobs resumed after the restart continue from these files
+            keep = in_flight_files()
             for item in os.listdir(OUTPUT_DIR):
+                if item in keep:
+                    continue
                 item_path = os.path.join(OUTPUT_DIR, item)
                 if os.path.isdir(item_path):
                     shutil.rmtree(item_path)
@@ -69,9 +100,12 @@ user_downloads = {} # Store download preferences per user
 def auto_cleanup_all_errors():
     """Comprehensive cleanup function for all errors"""
     try:
-        # Clean downloads folder
+        # Clean downloads folder, except files of jobs still queued or running
         if os.path.exists(OUTPUT_DIR):
+            keep = in_flight_files()
             for item in os.listdir(OUTPUT_DIR):
+                if item in keep:
+                    continue
                 item_path = os.path.join(OUTPUT_DIR, item)
                 try:
                     if os.path.isdir(item_path):
@@ -104,6 +138,7 @@ def cleanup_resources():
                 expired_users.append(chat_id)
 
         for chat_id in expired_users:
+            prefetcher.cancel(chat_id)
             user_state.pop(chat_id, None)
             user_cancel.pop(chat_id, None)
             user_downloads.pop(chat_id, None) # Also clean user download preferences
@@ -170,7 +205,7 @@ def start_smart_auto_ping():
 
                 # Keep alive server ping
                 try:
-                    response = requests.get("http://0.0.0.0:8080/health", timeout=5)
+                    response = http_client.get("http://0.0.0.0:8080/health", timeout=5)
                     if response.status_code == 200:
                         print("🌐 Keep alive server pinged successfully")
                     else:
@@ -232,7 +267,7 @@ def start_simple_keepalive():
 
                 # Only ping the keep-alive server, not the bot
                 try:
-                    requests.get("http://0.0.0.0:8080/health", timeout=5)
+                    http_client.get("http://0.0.0.0:8080/health", timeout=5)
                     print("🌐 Simple keep-alive ping sent")
                 except Exception as e:
                     print(f"⚠️ Simple keep-alive failed: {e}")
@@ -305,7 +340,8 @@ def start_comprehensive_error_monitor():
                 if stuck_users:
                     print(f"🚨 Stuck user sessions detected: {len(stuck_users)} users")
                     for chat_id in stuck_users:
-                        cleanup_user_downloads(chat_id)
+                        # Only the session goes; its queued/running jobs keep their files
+                        prefetcher.cancel(chat_id)
                         user_state.pop(chat_id, None)
                         user_cancel.pop(chat_id, None)
                         autodemo_active.pop(chat_id, None)
@@ -357,55 +393,6 @@ def start_comprehensive_error_monitor():
     monitor_thread.daemon = True
     monitor_thread.start()
 
-# -------------------- Fungsi Ambil Data Manga --------------------
-def get_manga_info(manga_url):
-    resp = requests.get(manga_url, headers={"User-Agent": "Mozilla/5.0"})
-    if resp.status_code != 200:
-        return None, None, None, None
-
-    soup = BeautifulSoup(resp.text, "html.parser")
-    chapter_links = soup.select("a[href*='chapter']")
-    if not chapter_links:
-        return None, None, None, None
-
-    first_chapter = chapter_links[0]["href"]
-    if not first_chapter.startswith("http"):
-        first_chapter = "https://komiku.org" + first_chapter
-
-    slug = first_chapter.split("-chapter-")[0].replace("https://komiku.org/", "").strip("/")
-    base_url = f"https://komiku.org/{slug}-chapter-{{}}/"
-    manga_name = slug.split("/")[-1]
-
-    chapter_numbers = set()
-    chapter_list = []  # Store all chapter identifiers
-    for link in chapter_links:
-        href = link["href"]
-        if "-chapter-" in href:
-            try:
-                chapter_str = href.split("-chapter-")[-1].replace("/", "").split("?")[0]
-                chapter_list.append(chapter_str)
-                # Try to parse as number for sorting, skip if contains special chars
-                try:
-                    if '.' in chapter_str and '-' not in chapter_str:
-                        num = float(chapter_str)
-                    elif '-' not in chapter_str and not any(c.isalpha() for c in chapter_str):
-                        num = int(chapter_str)
-                    else:
-                        # Skip chapters with special formatting like "160-5" or "extra"
-                        continue
-                    chapter_numbers.add(num)
-                except ValueError:
-                    # Skip chapters that can't be parsed as numbers
-                    continue
-            except:
-                pass
-
-    # Sort chapters properly (handle both int and float)
-    sorted_chapters = sorted(chapter_list, key=lambda x: float(x) if '.' in x and '-' not in x else (int(x) if '-' not in x and not any(c.isalpha() for c in x) else float('inf')))
-    total_chapters = max(chapter_numbers) if chapter_numbers else None
-
-    return base_url, manga_name, total_chapters, sorted_chapters
-
 # Auto-delete PDF function - delete after 10 seconds
 def auto_delete_pdf(pdf_path, delay=10):
     """Delete PDF file after specified delay"""
@@ -422,13 +409,44 @@ def auto_delete_pdf(pdf_path, delay=10):
     delete_thread.daemon = True
     delete_thread.start()
 
+# Minimum seconds between upload progress edits (Telegram rate-limits edits)
+UPLOAD_PROGRESS_INTERVAL = float(os.getenv("UPLOAD_PROGRESS_INTERVAL", "3"))
+
+def make_upload_progress(chat_id, message_id, pdf_name):
+    """Progress callback that edits the status message at most every UPLOAD_PROGRESS_INTERVAL"""
+    last_edit = [0.0]
+
+    def progress(sent, total, rate):
+        now = time.time()
+        if sent < total and now - last_edit[0] < UPLOAD_PROGRESS_INTERVAL:
+            return
+        last_edit[0] = now
+        percent = sent * 100 // total if total else 100
+        try:
+            bot.edit_message_text(
+                f"📤 Mengupload {pdf_name} ke GoFile... {percent}%\n"
+                f"{sent/(1024*1024):.1f}/{total/(1024*1024):.1f}MB • {rate/(1024*1024):.2f}MB/s",
+                chat_id,
+                message_id
+            )
+        except Exception:
+            pass
+
+    return progress
+
 def upload_to_gofile_and_send_link(chat_id, pdf_path, pdf_name):
     """Upload PDF to GoFile and send download link to user"""
     try:
-        bot.send_message(chat_id, "📤 Mengupload ke GoFile...")
+        status_msg = bot.send_message(chat_id, "📤 Mengupload ke GoFile...")
+        progress = make_upload_progress(chat_id, status_msg.message_id, pdf_name)
 
         # Upload to GoFile
-        result = file_uploader.upload_file(pdf_path, pdf_name)
+        with metrics.timed("gofile_upload") as stage:
+            result = file_uploader.upload_file(pdf_path, pdf_name, progress=progress)
+            if result:
+                stage.add_bytes(result['file_size'])
+            else:
+                stage.fail()
 
         if result:
             file_size_mb = result['file_size'] / (1024 * 1024)
@@ -460,36 +478,145 @@ def upload_to_gofile_and_send_link(chat_id, pdf_path, pdf_name):
         return False
 
 
-def cleanup_user_downloads(chat_id):
-    """Clean up all download files and folders for a specific user"""
+def send_gofile_folder_link(chat_id, result, title):
+    """Send one message with the GoFile folder holding a whole batch of PDFs"""
+    uploaded = result['uploaded']
+    if not uploaded:
+        return False
+    total_mb = sum(item['file_size'] for item in uploaded) / (1024 * 1024)
+
+    markup = types.InlineKeyboardMarkup()
+    if result['folder_link']:
+        link_message = (
+            f"✅ **{title}** berhasil diupload ke GoFile!\n\n"
+            f"📂 **Folder**: {result['folder_link']}\n"
+            f"📄 **File**: {len(uploaded)} PDF\n"
+            f"📁 **Total**: {total_mb:.1f}MB"
+        )
+        markup.add(types.InlineKeyboardButton("📂 Buka Folder", url=result['folder_link']))
+    else:
+        # No shared folder came back: list every file's page instead
+        lines = [f"• {item['file_name']}: {item['download_page']}" for item in uploaded]
+        link_message = f"✅ **{title}** berhasil diupload ke GoFile!\n\n" + "\n".join(lines)
+
+    bot.send_message(chat_id, link_message, reply_markup=markup, parse_mode='Markdown')
+    return True
+
+def send_pdf_parts(chat_id, parts, manga_name, manifest=None):
+    """Send a merged PDF that was split into several parts, one document each"""
+    # Parts already sent before a restart are skipped
+    sent = {path for path, _, done in manifest.parts() if done} if manifest else set()
+    bot.send_message(chat_id, f"📦 PDF dibagi menjadi {len(parts)} bagian agar muat di batas Telegram (50MB).")
+    for number, (part_file, part_chapters) in enumerate(parts, 1):
+        if part_file in sent:
+            continue
+        file_size = os.path.getsize(part_file)
+        caption = (f"📚 {manga_name} chapter {part_chapters[0]}-{part_chapters[-1]} "
+                   f"(part {number}/{len(parts)}, {file_size/(1024*1024):.1f}MB)")
+        try:
+            send_pdf_document(chat_id, part_file, caption)
+            print(f"✅ PDF part sent successfully: {part_file}")
+            if manifest:
+                manifest.mark_part_sent(part_file)
+        except Exception as e:
+            print(f"❌ Upload error: {e}")
+            bot.send_message(chat_id, f"❌ Gagal upload part {number}: {e}")
+        auto_delete_pdf(part_file, 10)
+
+def is_stale_file_id(api_error):
+    """True if Telegram rejected the file_id itself (unknown, malformed or expired)"""
+    error_desc = str(getattr(api_error, 'description', api_error)).lower()
+    return getattr(api_error, 'error_code', None) == 400 and (
+        "file identifier" in error_desc or "file_id" in error_desc or "file reference" in error_desc
+    )
+
+def send_cached_document(chat_id, file_key):
+    """Resend a PDF by its Telegram file_id; False if unknown or the id went stale.
+
+    Other errors (timeouts, connection errors) are raised: the document may
+    already have been delivered, so falling back to a fresh upload could send
+    it twice.
+    """
+    entry = file_id_index.get(file_key)
+    if not entry:
+        return False
     try:
-        if chat_id in user_state and isinstance(user_state[chat_id], dict):
-            manga_name = user_state[chat_id].get("manga_name", "")
-            awal_str = user_state[chat_id].get("awal", "1")
-            akhir_str = user_state[chat_id].get("akhir", "1")
-            available_chapters = user_state[chat_id].get("available_chapters", [])
-            download_mode = user_state[chat_id].get("mode", "normal")
+        with metrics.timed("telegram_send"):
+            bot.send_document(chat_id, entry["file_id"], caption=entry.get("caption"))
+    except telebot.apihelper.ApiTelegramException as api_error:
+        if not is_stale_file_id(api_error):
+            raise
+        print(f"⚠️ file_id tidak valid lagi, upload ulang: {api_error}")
+        file_id_index.remove(file_key)
+        return False
+    print(f"⚡ PDF dikirim ulang via file_id: {entry.get('caption')}")
+    return True
+
+def send_pdf_document(chat_id, pdf_path, caption, file_key=None):
+    """Upload a PDF to Telegram and remember the returned file_id for repeat requests"""
+    with metrics.timed("telegram_send") as stage, open(pdf_path, "rb") as pdf_file:
+        sent = bot.send_document(
+            chat_id,
+            pdf_file,
+            caption=caption,
+            timeout=300
+        )
+        stage.add_bytes(os.path.getsize(pdf_path))
+    if file_key and sent and getattr(sent, "document", None):
+        file_id_index.put(file_key, sent.document.file_id, caption)
+    return sent
+
+
+def get_chapter_index(state):
+    """ChapterIndex of the session's series, built once per series and kept in the state"""
+    chapter_index = state.get("chapter_index")
+    if chapter_index is None:
+        chapter_index = ChapterIndex(state.get("available_chapters", []))
+        state["chapter_index"] = chapter_index
+    return chapter_index
+
+
+def start_prefetch(chat_id, state, chapter):
+    """Fetch the first chapter's page and first images while the user picks the rest of the range"""
+    download_mode = state.get("mode", "normal")
+    base_url = state["base_url"]
+    if chapter_cache.contains(series_slug(base_url), chapter, download_mode):
+        return
+    page_url = chapter_page_urls(state.get("manga_url"), [chapter]).get(chapter, base_url.format(chapter))
+    prefetcher.start(chat_id, page_url,
+                     lambda html: chapter_image_urls(html, download_mode, quiet=True))
+
+
+def resolve_chapter_input(message, chapter_index, text):
+    """Chapter matching the user's input, or None after replying why it does not match"""
+    chapter = chapter_index.resolve(text)
+    if chapter:
+        return chapter
+    number = chapter_number(text)
+    if number is None:
+        bot.reply_to(message, "❌ Format chapter tidak valid. Contoh: 1, 9, 1.5, 7.2")
+    elif number <= 0:
+        bot.reply_to(message, "❌ Chapter harus lebih dari 0.")
+    else:
+        # Show the chapters around the requested number for reference
+        nearby = chapter_index.around(text)
+        bot.reply_to(message, f"❌ Chapter {text.strip()} tidak tersedia.\n\nChapter tersedia: {', '.join(nearby)}")
+    return None
 
-            # Determine the chapters that were intended for download based on the state
-            chapters_to_cleanup = []
-            if available_chapters and awal_str in available_chapters and akhir_str in available_chapters:
-                awal_index = available_chapters.index(awal_str)
-                akhir_index = available_chapters.index(akhir_str)
-                chapters_to_cleanup = available_chapters[awal_index:akhir_index + 1]
-            elif "chapters_to_download" in user_state[chat_id]:
-                # If 'chapters_to_download' is available (after fix), use that
-                chapters_to_download_from_state = user_state[chat_id]["chapters_to_download"]
-                chapters_to_cleanup = chapters_to_download_from_state
-
-            for ch_str in chapters_to_cleanup:
-                if download_mode == "big":
-                    folder_ch = os.path.join(OUTPUT_DIR, f"chapter-{ch_str}-big")
-                else:
-                    folder_ch = os.path.join(OUTPUT_DIR, f"chapter-{ch_str}")
 
-                if os.path.exists(folder_ch):
-                    shutil.rmtree(folder_ch)
-                    print(f"🗑️ Deleted folder: {folder_ch}")
+def cleanup_job_files(job_state):
+    """Delete the working folder (chapter pages) of one job"""
+    folder = job_output_dir(job_state)
+    if os.path.exists(folder):
+        shutil.rmtree(folder)
+        print(f"🗑️ Deleted folder: {folder}")
+
+def cleanup_user_downloads(chat_id):
+    """Clean up the working folders of all unfinished jobs of a specific user"""
+    try:
+        for manifest in job_manifests.unfinished():
+            if manifest.chat_id == chat_id:
+                cleanup_job_files(manifest.state)
 
         print(f"🧹 Cleanup completed for user {chat_id}")
     except Exception as e:
@@ -521,6 +648,7 @@ def start(message):
 @bot.message_handler(commands=['manga'])
 def manga_mode(message):
     chat_id = message.chat.id
+    prefetcher.cancel(chat_id)
     user_state[chat_id] = {"step": "link", "mode": "normal", "timestamp": time.time()}
     tutorial = (
         "📖 Mode Normal aktif! Download manga dari Komiku 📚\n\n"
@@ -564,9 +692,13 @@ def handle_mode_selection(call):
 def cancel_download(message):
     chat_id = message.chat.id
     user_cancel[chat_id] = True
+    # Queued jobs of this user never start
+    scheduler.cancel_user(chat_id)
+    prefetcher.cancel(chat_id)
 
     # Clean up any existing downloads immediately
     cleanup_user_downloads(chat_id)
+    job_manifests.discard_user(chat_id)
 
     bot.reply_to(message, "⛔ Download dihentikan! Semua file telah dihapus.")
 
@@ -704,6 +836,7 @@ def clear_messages(message):
 @bot.message_handler(commands=['komik'])
 def komik_mode(message):
     chat_id = message.chat.id
+    prefetcher.cancel(chat_id)
     user_state[chat_id] = {"step": "link", "mode": "big", "timestamp": time.time()}
     tutorial = (
         "🔥 Mode Komik aktif! Download gambar yang lebih panjang\n\n"
@@ -721,6 +854,10 @@ def komik_mode(message):
     )
     bot.reply_to(message, tutorial)
 
+def autodemo_output_dir(chat_id):
+    """Working folder of a user's autodemo, apart from their download jobs"""
+    return os.path.join(OUTPUT_DIR, f"autodemo-{chat_id}")
+
 # -------------------- Handler /autodemo --------------------
 @bot.message_handler(commands=['autodemo'])
 def start_autodemo(message):
@@ -753,6 +890,7 @@ def start_autodemo(message):
         ]
         current_url_index = 0
         chapter_start_num = 1
+        demo_dir = autodemo_output_dir(chat_id)
 
         try:
             while autodemo_active.get(chat_id, False):
@@ -790,6 +928,7 @@ def start_autodemo(message):
                     base_url, manga_name, total_chapters, sorted_chapters = get_manga_info(manga_url)
                     if base_url and manga_name and sorted_chapters and autodemo_active.get(chat_id, False):
                         user_state[chat_id].update({
+                            "manga_url": manga_url,
                             "base_url": base_url,
                             "manga_name": manga_name,
                             "total_chapters": total_chapters,
@@ -870,7 +1009,9 @@ def start_autodemo(message):
                                     # Longer delay to reduce system load
                                     time.sleep(10)
 
-                                    imgs = download_chapter(base_url_format.format(ch), ch, OUTPUT_DIR, chat_id, user_cancel)
+                                    page_url = chapter_page_urls(manga_url, [ch]).get(ch)
+                                    imgs = download_chapter(base_url_format.format(ch), ch, demo_dir, chat_id, user_cancel,
+                                                            page_url=page_url)
 
                                     if imgs and not user_cancel.get(chat_id):
                                         pdf_name = f"{manga_name_demo} chapter {ch}.pdf"
@@ -912,7 +1053,7 @@ def start_autodemo(message):
                                             # Still delete even if upload failed
                                             auto_delete_pdf(pdf_path, 10)
 
-                                    folder_ch = os.path.join(OUTPUT_DIR, f"chapter-{ch}")
+                                    folder_ch = chapter_dir(demo_dir, base_url_format.format(ch), ch)
                                     if os.path.exists(folder_ch):
                                         shutil.rmtree(folder_ch)
 
@@ -1003,7 +1144,8 @@ def start_autodemo(message):
                     user_downloads.pop(chat_id, None) # Clean user download preferences too
 
                 # Clean any downloads
-                cleanup_user_downloads(chat_id)
+                if os.path.exists(demo_dir):
+                    shutil.rmtree(demo_dir)
 
                 # Remove thread reference
                 if chat_id in autodemo_thread:
@@ -1050,7 +1192,9 @@ def stop_autodemo(message):
             autodemo_thread.pop(chat_id, None)
 
     # Clean up any ongoing downloads
-    cleanup_user_downloads(chat_id)
+    demo_dir = autodemo_output_dir(chat_id)
+    if os.path.exists(demo_dir):
+        shutil.rmtree(demo_dir, ignore_errors=True)
 
     # Clean up user state after thread is properly stopped
     user_state.pop(chat_id, None)
@@ -1351,10 +1495,12 @@ def handle_message(message):
                 return
 
             user_state[chat_id].update({
+                "manga_url": text,
                 "base_url": base_url,
                 "manga_name": manga_name,
                 "total_chapters": total_chapters,
-                "available_chapters": sorted_chapters
+                "available_chapters": sorted_chapters,
+                "chapter_index": ChapterIndex(sorted_chapters)
             })
 
             user_state[chat_id]["step"] = "awal"
@@ -1362,143 +1508,36 @@ def handle_message(message):
             bot.reply_to(message, f"✅ Manga berhasil diambil: **{manga_name}**\nTotal chapter: {total_chapters if total_chapters else 'Tidak diketahui'}\n\nMasukkan chapter awal (bisa decimal seperti 1.5):")
 
         elif step == "awal":
-            # Normalize input - convert simple numbers to match available format
-            chapter_awal_str = text.strip()
-            available_chapters = user_state[chat_id].get("available_chapters", [])
-
-            # Try to find matching chapter in available list
-            matched_chapter = None
-
-            # First, try exact match
-            if chapter_awal_str in available_chapters:
-                matched_chapter = chapter_awal_str
-            else:
-                # Try to match with different formats
-                try:
-                    # Convert input to number for comparison
-                    if '.' in chapter_awal_str and '-' not in chapter_awal_str:
-                        input_num = float(chapter_awal_str)
-                    elif '-' not in chapter_awal_str and not any(c.isalpha() for c in chapter_awal_str):
-                        input_num = int(chapter_awal_str)
-                    else:
-                        bot.reply_to(message, "❌ Format chapter tidak valid. Hindari karakter khusus seperti '-' atau huruf.")
-                        return
-
-                    if input_num <= 0:
-                        bot.reply_to(message, "❌ Chapter harus lebih dari 0.")
-                        return
-
-                    # Find matching chapter in available list
-                    for ch in available_chapters:
-                        try:
-                            if '.' in ch and '-' not in ch:
-                                ch_num = float(ch)
-                            elif '-' not in ch and not any(c.isalpha() for c in ch):
-                                ch_num = int(ch)
-                            else:
-                                continue
-
-                            if ch_num == input_num:
-                                matched_chapter = ch
-                                break
-                        except ValueError:
-                            continue
-
-                except ValueError:
-                    bot.reply_to(message, "❌ Format chapter tidak valid. Contoh: 1, 9, 1.5, 7.2")
-                    return
-
+            chapter_index = get_chapter_index(user_state[chat_id])
+            matched_chapter = resolve_chapter_input(message, chapter_index, text)
             if not matched_chapter:
-                # Show available chapters for user reference
-                sample_chapters = available_chapters[:15] if len(available_chapters) > 15 else available_chapters
-                bot.reply_to(message, f"❌ Chapter {chapter_awal_str} tidak tersedia.\n\nChapter tersedia: {', '.join(sample_chapters)}")
                 return
 
             user_state[chat_id]["awal"] = matched_chapter
             user_state[chat_id]["step"] = "akhir"
             bot.reply_to(message, f"✅ Chapter awal: {matched_chapter}\n📌 Masukkan chapter akhir (contoh: 9, 15.5):")
+            # The range always starts here, so its first pages can load while the user types the end
+            start_prefetch(chat_id, user_state[chat_id], matched_chapter)
 
         elif step == "akhir":
-            # Normalize input - convert simple numbers to match available format
-            chapter_akhir_str = text.strip()
-            available_chapters = user_state[chat_id].get("available_chapters", [])
-
-            # Try to find matching chapter in available list
-            matched_chapter = None
-
-            # First, try exact match
-            if chapter_akhir_str in available_chapters:
-                matched_chapter = chapter_akhir_str
-            else:
-                # Try to match with different formats
-                try:
-                    # Convert input to number for comparison
-                    if '.' in chapter_akhir_str and '-' not in chapter_akhir_str:
-                        input_num = float(chapter_akhir_str)
-                    elif '-' not in chapter_akhir_str and not any(c.isalpha() for c in chapter_akhir_str):
-                        input_num = int(chapter_akhir_str)
-                    else:
-                        bot.reply_to(message, "❌ Format chapter tidak valid. Hindari karakter khusus seperti '-' atau huruf.")
-                        return
-
-                    if input_num <= 0:
-                        bot.reply_to(message, "❌ Chapter harus lebih dari 0.")
-                        return
-
-                    # Find matching chapter in available list
-                    for ch in available_chapters:
-                        try:
-                            if '.' in ch and '-' not in ch:
-                                ch_num = float(ch)
-                            elif '-' not in ch and not any(c.isalpha() for c in ch):
-                                ch_num = int(ch)
-                            else:
-                                continue
-
-                            if ch_num == input_num:
-                                matched_chapter = ch
-                                break
-                        except ValueError:
-                            continue
-
-                except ValueError:
-                    bot.reply_to(message, "❌ Format chapter tidak valid. Contoh: 1, 9, 1.5, 7.2")
-                    return
-
+            chapter_index = get_chapter_index(user_state[chat_id])
+            matched_chapter = resolve_chapter_input(message, chapter_index, text)
             if not matched_chapter:
-                # Show available chapters for user reference
-                sample_chapters = available_chapters[:15] if len(available_chapters) > 15 else available_chapters
-                bot.reply_to(message, f"❌ Chapter {chapter_akhir_str} tidak tersedia.\n\nChapter tersedia: {', '.join(sample_chapters)}")
                 return
 
             awal_str = user_state[chat_id].get("awal", "1")
             download_mode = user_state[chat_id].get("mode", "normal")
 
-            # Find positions in available chapters list
-            try:
-                awal_index = available_chapters.index(awal_str)
-                akhir_index = available_chapters.index(matched_chapter)
-            except ValueError:
+            if awal_str not in chapter_index:
                 bot.reply_to(message, "❌ Error dalam menentukan posisi chapter.")
                 return
 
-            if akhir_index < awal_index:
+            if chapter_index.position(matched_chapter) < chapter_index.position(awal_str):
                 bot.reply_to(message, f"❌ Chapter akhir harus berada setelah atau sama dengan chapter awal ({awal_str}).")
                 return
 
-            # Calculate actual chapter count based on available chapters
-            chapter_count = akhir_index - awal_index + 1
-            chapters_to_download = available_chapters[awal_index:akhir_index + 1]
-
-            # Remove duplicates while preserving order
-            unique_chapters = []
-            seen = set()
-            for ch in chapters_to_download:
-                if ch not in seen:
-                    unique_chapters.append(ch)
-                    seen.add(ch)
-
-            chapters_to_download = unique_chapters
+            # The index holds each chapter once, so the range needs no dedupe pass
+            chapters_to_download = chapter_index.slice(awal_str, matched_chapter)
             chapter_count = len(chapters_to_download)
 
             # Check chapter limit for Komik mode
@@ -1576,15 +1615,10 @@ def handle_mode(call):
         return
 
     mode = call.data
-    use_gofile = mode.startswith("gofile_")
-    actual_mode = mode.replace("gofile_", "") if use_gofile else mode
-
-    base_url = user_state[chat_id]["base_url"]
-    manga_name = user_state[chat_id]["manga_name"]
-    awal = user_state[chat_id]["awal"]
-    akhir = user_state[chat_id]["akhir"]
-    download_mode = user_state[chat_id].get("mode", "normal")
-    chapters_to_download = user_state[chat_id].get("chapters_to_download", []) # Use stored unique chapters
+    # Snapshot the session: the job may only start after the user began a new one
+    job_state = dict(user_state[chat_id])
+    download_mode = job_state.get("mode", "normal")
+    chapters_to_download = job_state.get("chapters_to_download", [])
 
     # Remove the inline keyboard buttons
     try:
@@ -1593,38 +1627,186 @@ def handle_mode(call):
         pass
 
     user_cancel[chat_id] = False  # reset cancel flag
+
+    # Exact page URLs from the series page, kept with the job so a resumed job has them too
+    job_state["chapter_urls"] = chapter_page_urls(job_state.get("manga_url"), chapters_to_download)
+
+    # Written before queueing so the job is resumed if the bot restarts before it finishes
+    manifest = job_manifests.create(chat_id, mode, job_state)
+    job_state["job_id"] = manifest.id
+    # Marks the session as this job's, so the job only tears down its own session
+    user_state[chat_id]["job_id"] = manifest.id
+    job = Job(
+        chat_id,
+        download_mode,
+        lambda: run_download_job(chat_id, mode, job_state, manifest),
+        description=f"{job_state.get('manga_name')} {job_state.get('awal')}-{job_state.get('akhir')}",
+        units=len(chapters_to_download)
+    )
+    try:
+        position, eta = scheduler.submit(job)
+    except JobLimitError:
+        manifest.finish()
+        bot.send_message(chat_id, "⚠️ Masih ada download kamu di antrian. Tunggu selesai dulu atau /cancel.")
+        return
+
+    if position > 0:
+        eta_min = max(1, round(eta / 60))
+        bot.send_message(chat_id, f"📋 Masuk antrian posisi {position}. Perkiraan mulai dalam ~{eta_min} menit.")
+
+def resume_saved_jobs():
+    """Queue the jobs that were queued or running when the bot last stopped"""
+    for manifest in job_manifests.unfinished():
+        chat_id = manifest.chat_id
+        job_state = manifest.state
+        description = f"{job_state.get('manga_name')} {job_state.get('awal')}-{job_state.get('akhir')}"
+        user_cancel[chat_id] = False
+        job = Job(
+            chat_id,
+            job_state.get("mode", "normal"),
+            lambda chat_id=chat_id, job_state=job_state, manifest=manifest:
+                run_download_job(chat_id, manifest.mode, job_state, manifest),
+            description=description,
+            units=len(job_state.get("chapters_to_download") or [])
+        )
+        try:
+            scheduler.submit(job)
+        except JobLimitError:
+            # The user already has as many jobs queued as allowed: drop this one and say so
+            print(f"⚠️ Cannot resume job {manifest.id} for {chat_id}: {description} (queue full)")
+            cleanup_job_files(job_state)
+            manifest.finish()
+            try:
+                bot.send_message(chat_id, f"⚠️ Bot sempat restart dan download {description} tidak bisa dilanjutkan "
+                                          f"karena antrian kamu penuh. Silakan ulangi setelah download lain selesai.")
+            except Exception as e:
+                print(f"❌ Failed to send resume notice: {e}")
+            continue
+        print(f"♻️ Resuming job {manifest.id} for {chat_id}: {description}")
+        try:
+            bot.send_message(chat_id, f"♻️ Bot sempat restart. Melanjutkan download {description}...")
+        except Exception as e:
+            print(f"❌ Failed to send resume notice: {e}")
+
+
+def release_job_session(chat_id, job_state):
+    """Drop the live session of a user if it is still the one this job was started from"""
+    state = user_state.get(chat_id)
+    if not isinstance(state, dict) or state.get("job_id") != job_state.get("job_id"):
+        return
+    user_state.pop(chat_id, None)
+    user_cancel.pop(chat_id, None)
+    user_downloads.pop(chat_id, None) # Clean user download preferences too
+
+def run_download_job(chat_id, mode, job_state, manifest=None):
+    """Run one download/PDF/upload job; called from a scheduler worker thread"""
+    try:
+        _run_download_job(chat_id, mode, job_state, manifest)
+    finally:
+        # Done, cancelled or failed: the job's pages are no longer needed
+        try:
+            cleanup_job_files(job_state)
+        except Exception as e:
+            print(f"❌ Cleanup error for job {job_state.get('job_id')}: {e}")
+        # Nothing left to resume
+        if manifest:
+            manifest.finish()
+
+
+def _run_download_job(chat_id, mode, job_state, manifest):
+    use_gofile = mode.startswith("gofile_")
+    actual_mode = mode.replace("gofile_", "") if use_gofile else mode
+
+    base_url = job_state["base_url"]
+    manga_name = job_state["manga_name"]
+    awal = job_state["awal"]
+    akhir = job_state["akhir"]
+    download_mode = job_state.get("mode", "normal")
+    chapters_to_download = job_state.get("chapters_to_download", []) # Use stored unique chapters
+    chapter_urls = job_state.get("chapter_urls") or {}  # Missing in manifests saved before it was kept
+    slug = series_slug(base_url)
+    job_dir = job_output_dir(job_state)
+    # Stop prefetching but keep what it fetched; the download picks it up from the store
+    prefetcher.cancel(chat_id, discard=False)
+
+    if user_cancel.get(chat_id):
+        return
+
     bot.send_message(chat_id, f"⏳ Sedang download chapter {' & '.join(chapters_to_download)}...")
 
     try:
         if actual_mode == "gabung":
-            all_images = []
+            pdf_name = f"{manga_name} chapter {awal}-{akhir}.pdf"
+            pdf_path = os.path.join(OUTPUT_DIR, pdf_name)
 
-            for ch_str in chapters_to_download:
-                if user_cancel.get(chat_id):
-                    bot.send_message(chat_id, "❌ Download dihentikan! Membersihkan file...")
-                    cleanup_user_downloads(chat_id)
-                    return
+            # Identical series/range/mode was built before: skip download and encode
+            pdf_key = artifact_key(slug, chapters_to_download, download_mode, pdf_settings())
+            pdf_ready = False
+            pdf_parts = [(pdf_path, chapters_to_download)]
 
-                bot.send_message(chat_id, f"📥 Download chapter {ch_str}...")
+            saved_parts = manifest.parts() if manifest else []
+            if not use_gofile and send_cached_document(chat_id, pdf_key):
+                # Sent before: Telegram already has it, nothing to build or upload
+                pass
+            elif len(saved_parts) > 1 and all(sent or os.path.exists(path) for path, _, sent in saved_parts):
+                # Parts were built before a restart: only the unsent ones go out
+                pdf_parts = [(path, chapters) for path, chapters, _ in saved_parts]
+                pdf_ready = True
+            elif pdf_cache.get(pdf_key, pdf_path) and (use_gofile or os.path.getsize(pdf_path) <= PDF_PART_MAX_BYTES):
+                pdf_ready = True
+                print(f"⚡ PDF cache hit: {pdf_name}")
+            else:
+                # A cached copy too big for Telegram is rebuilt below as parts
+                if os.path.exists(pdf_path):
+                    os.remove(pdf_path)
+                all_images = []
+                chapter_images = []
+                missing_chapter = False
+
+                for ch_str in chapters_to_download:
+                    if user_cancel.get(chat_id):
+                        bot.send_message(chat_id, "❌ Download dihentikan! Membersihkan file...")
+                        return
 
-                if download_mode == "big":
-                    imgs = download_chapter_big(base_url.format(ch_str), ch_str, OUTPUT_DIR, chat_id, user_cancel)
-                else:
-                    imgs = download_chapter(base_url.format(ch_str), ch_str, OUTPUT_DIR, chat_id, user_cancel)
+                    bot.send_message(chat_id, f"📥 Download chapter {ch_str}...")
 
-                # Check cancel status after each chapter download
-                if user_cancel.get(chat_id):
-                    bot.send_message(chat_id, "❌ Download dihentikan! Membersihkan file...")
-                    cleanup_user_downloads(chat_id)
-                    return
+                    checkpoint = manifest.chapter(ch_str) if manifest else None
+                    page_url = chapter_urls.get(ch_str)
+                    if download_mode == "big":
+                        imgs = download_chapter_big(base_url.format(ch_str), ch_str, job_dir, chat_id, user_cancel,
+                                                    checkpoint=checkpoint, page_url=page_url)
+                    else:
+                        imgs = download_chapter(base_url.format(ch_str), ch_str, job_dir, chat_id, user_cancel,
+                                                checkpoint=checkpoint, page_url=page_url)
 
-                all_images.extend(imgs)
+                    # Check cancel status after each chapter download
+                    if user_cancel.get(chat_id):
+                        bot.send_message(chat_id, "❌ Download dihentikan! Membersihkan file...")
+                        return
 
-            if all_images and not user_cancel.get(chat_id):
-                pdf_name = f"{manga_name} chapter {awal}-{akhir}.pdf"
-                pdf_path = os.path.join(OUTPUT_DIR, pdf_name)
-                create_pdf(all_images, pdf_path)
+                    if not imgs:
+                        missing_chapter = True
+                    all_images.extend(imgs)
+                    chapter_images.append((ch_str, imgs))
 
+                if all_images and not user_cancel.get(chat_id):
+                    if use_gofile:
+                        # No size limit on GoFile: keep full quality
+                        create_pdf(all_images, pdf_path, max_bytes=None)
+                        pdf_ready = os.path.exists(pdf_path)
+                    else:
+                        # Split into parts under the Telegram limit instead of rejecting later
+                        pdf_parts = create_pdf_parts(chapter_images, pdf_path)
+                        pdf_ready = bool(pdf_parts)
+                        if manifest and len(pdf_parts) > 1:
+                            manifest.set_parts(pdf_parts)
+                    # Don't cache a range that is missing chapters (or split into parts)
+                    if pdf_ready and not missing_chapter and len(pdf_parts) == 1:
+                        pdf_cache.put(pdf_key, pdf_path, pdf_name)
+
+            if pdf_ready and len(pdf_parts) > 1:
+                send_pdf_parts(chat_id, pdf_parts, manga_name, manifest)
+            elif pdf_ready:
                 try:
                     # Check file size before upload (Telegram limit is 50MB)
                     file_size = os.path.getsize(pdf_path)
@@ -1636,13 +1818,7 @@ def handle_mode(call):
                         if not upload_success:
                             # Fallback to direct upload if GoFile fails and file is small enough
                             if file_size <= max_size:
-                                with open(pdf_path, "rb") as pdf_file:
-                                    bot.send_document(
-                                        chat_id,
-                                        pdf_file,
-                                        caption=f"📚 {pdf_name} ({file_size/(1024*1024):.1f}MB)",
-                                        timeout=300
-                                    )
+                                send_pdf_document(chat_id, pdf_path, f"📚 {pdf_name} ({file_size/(1024*1024):.1f}MB)", pdf_key)
                                 print(f"✅ PDF sent successfully as fallback: {pdf_name}")
                         auto_delete_pdf(pdf_path, 10)
                     else:
@@ -1654,13 +1830,7 @@ def handle_mode(call):
                             auto_delete_pdf(pdf_path, 5)
                             return
 
-                        with open(pdf_path, "rb") as pdf_file:
-                            bot.send_document(
-                                chat_id,
-                                pdf_file,
-                                caption=f"📚 {pdf_name} ({file_size/(1024*1024):.1f}MB)",
-                                timeout=300
-                            )
+                        send_pdf_document(chat_id, pdf_path, f"📚 {pdf_name} ({file_size/(1024*1024):.1f}MB)", pdf_key)
                         print(f"✅ PDF sent successfully: {pdf_name} ({file_size/(1024*1024):.1f}MB)")
                         auto_delete_pdf(pdf_path, 10)
                 except Exception as upload_error:
@@ -1674,100 +1844,168 @@ def handle_mode(call):
                         bot.send_message(chat_id, f"❌ Gagal upload {pdf_name}: {error_msg}")
                     auto_delete_pdf(pdf_path, 10)
 
-                # Bersih-bersih
-                for ch in chapters_to_download:
-                    if download_mode == "big":
-                        folder_ch = os.path.join(OUTPUT_DIR, f"chapter-{ch}-big")
-                    else:
-                        folder_ch = os.path.join(OUTPUT_DIR, f"chapter-{ch}")
-                    if os.path.exists(folder_ch):
-                        shutil.rmtree(folder_ch)
-
         elif actual_mode == "pisah":
-            for ch_str in chapters_to_download:
-                if user_cancel.get(chat_id):
-                    bot.send_message(chat_id, "❌ Download dihentikan! Membersihkan file...")
-                    cleanup_user_downloads(chat_id)
-                    return
+            # Download, PDF build and upload run as overlapping pipeline stages:
+            # chapter N+1 downloads while chapter N is encoded and N-1 uploads
+            def chapter_pdf(ch_str):
+                pdf_name = f"{manga_name} chapter {ch_str}.pdf"
+                return pdf_name, os.path.join(OUTPUT_DIR, pdf_name)
+
+            def chapter_key(ch_str):
+                return artifact_key(slug, [ch_str], download_mode, pdf_settings(PDF_PART_MAX_BYTES))
+
+            def download_stage(ch_str):
+                pdf_name, pdf_path = chapter_pdf(ch_str)
+                if not use_gofile and file_id_index.get(chapter_key(ch_str)):
+                    # Sent before: the upload stage resends it by file_id
+                    return ch_str, None
+                if pdf_cache.get(chapter_key(ch_str), pdf_path):
+                    # Built before: hand straight to upload, no images needed
+                    print(f"⚡ PDF cache hit: {pdf_name}")
+                    return ch_str, None
 
                 bot.send_message(chat_id, f"📥 Download chapter {ch_str}...")
 
-                # Add small delay to reduce system load
-                time.sleep(2)
-
+                checkpoint = manifest.chapter(ch_str) if manifest else None
+                page_url = chapter_urls.get(ch_str)
                 if download_mode == "big":
-                    imgs = download_chapter_big(base_url.format(ch_str), ch_str, OUTPUT_DIR, chat_id, user_cancel)
+                    imgs = download_chapter_big(base_url.format(ch_str), ch_str, job_dir, chat_id, user_cancel,
+                                                checkpoint=checkpoint, page_url=page_url)
                 else:
-                    imgs = download_chapter(base_url.format(ch_str), ch_str, OUTPUT_DIR, chat_id, user_cancel)
+                    imgs = download_chapter(base_url.format(ch_str), ch_str, job_dir, chat_id, user_cancel,
+                                            checkpoint=checkpoint, page_url=page_url)
 
-                # Check cancel status after each chapter download
                 if user_cancel.get(chat_id):
-                    bot.send_message(chat_id, "❌ Download dihentikan! Membersihkan file...")
-                    cleanup_user_downloads(chat_id)
+                    return None
+                if not imgs:
+                    bot.send_message(chat_id, f"⚠️ Chapter {ch_str} tidak ditemukan.")
+                    return None
+                return ch_str, imgs
+
+            def pdf_stage(item):
+                ch_str, imgs = item
+                pdf_name, pdf_path = chapter_pdf(ch_str)
+                if imgs is None:
+                    return ch_str, pdf_name, pdf_path
+
+                create_pdf(imgs, pdf_path)
+                if not os.path.exists(pdf_path):
+                    raise RuntimeError("PDF gagal dibuat")
+                pdf_cache.put(chapter_key(ch_str), pdf_path, pdf_name)
+
+                # Chapter images are no longer needed once the PDF is built
+                folder_ch = chapter_dir(job_dir, base_url.format(ch_str), ch_str, download_mode)
+                if os.path.exists(folder_ch):
+                    shutil.rmtree(folder_ch)
+
+                return ch_str, pdf_name, pdf_path
+
+            def upload_stage(item):
+                ch_str, pdf_name, pdf_path = item
+                pdf_key = chapter_key(ch_str)
+                if not use_gofile and send_cached_document(chat_id, pdf_key):
+                    if manifest:
+                        manifest.mark_sent(ch_str)
                     return
 
-                if imgs:
-                    pdf_name = f"{manga_name} chapter {ch_str}.pdf"
-                    pdf_path = os.path.join(OUTPUT_DIR, pdf_name)
-                    create_pdf(imgs, pdf_path)
+                if not os.path.exists(pdf_path):
+                    # file_id went stale and nothing was built: build it now
+                    item = download_stage(ch_str)
+                    item = pdf_stage(item) if item else None
+                    if not item:
+                        return
+                    ch_str, pdf_name, pdf_path = item
+
+                if use_gofile:
+                    # Every chapter goes into one GoFile folder, linked once at the end
+                    if gofile_batch.progress is None:
+                        status_msg = bot.send_message(chat_id, "📤 Mengupload ke GoFile...")
+                        gofile_batch.progress = make_upload_progress(
+                            chat_id, status_msg.message_id, f"chapter {awal}-{akhir}"
+                        )
+                    batch_chapters[pdf_path] = ch_str
+                    gofile_batch.add(pdf_path, pdf_name)
+                    return
 
-                    try:
-                        # Check file size before upload
-                        file_size = os.path.getsize(pdf_path)
-                        max_size = 50 * 1024 * 1024  # 50MB
-
-                        if use_gofile:
-                            # Always use GoFile when cloud upload is requested
-                            upload_success = upload_to_gofile_and_send_link(chat_id, pdf_path, pdf_name)
-                            if not upload_success:
-                                # Fallback to direct upload if GoFile fails and file is small enough
-                                if file_size <= max_size:
-                                    with open(pdf_path, "rb") as pdf_file:
-                                        bot.send_document(
-                                            chat_id,
-                                            pdf_file,
-                                            caption=f"📖 Chapter {ch_str} ({file_size/(1024*1024):.1f}MB)",
-                                            timeout=300
-                                        )
-                                    print(f"✅ PDF sent successfully as fallback: {pdf_name}")
-                            auto_delete_pdf(pdf_path, 10)
-                        else:
-                            # Regular Telegram upload
-                            if file_size > max_size:
-                                size_mb = file_size / (1024 * 1024)
-                                bot.send_message(chat_id, f"❌ Chapter {ch_str} terlalu besar ({size_mb:.1f}MB). 💡 Coba gunakan opsi GoFile untuk file besar.")
-                                auto_delete_pdf(pdf_path, 5)
-                                continue
+                try:
+                    # Check file size before upload
+                    file_size = os.path.getsize(pdf_path)
+                    max_size = 50 * 1024 * 1024  # 50MB
 
-                            with open(pdf_path, "rb") as pdf_file:
-                                bot.send_document(
-                                    chat_id,
-                                    pdf_file,
-                                    caption=f"📖 Chapter {ch_str} ({file_size/(1024*1024):.1f}MB)",
-                                    timeout=300
-                                )
-                            print(f"✅ PDF sent successfully: {pdf_name}")
-                            auto_delete_pdf(pdf_path, 10)
-                    except Exception as upload_error:
-                        print(f"❌ Upload error: {upload_error}")
-                        error_msg = str(upload_error)
-                        if "too large" in error_msg.lower():
-                            bot.send_message(chat_id, f"❌ Chapter {ch_str} terlalu besar untuk Telegram. 💡 Coba gunakan opsi GoFile.")
-                        elif "timeout" in error_msg.lower():
-                            bot.send_message(chat_id, f"⏱️ Upload chapter {ch_str} timeout.")
-                        else:
-                            bot.send_message(chat_id, f"❌ Gagal upload chapter {ch_str}: {error_msg}")
-                        auto_delete_pdf(pdf_path, 10)
+                    # Regular Telegram upload
+                    if file_size > max_size:
+                        size_mb = file_size / (1024 * 1024)
+                        bot.send_message(chat_id, f"❌ Chapter {ch_str} terlalu besar ({size_mb:.1f}MB). 💡 Coba gunakan opsi GoFile untuk file besar.")
+                        auto_delete_pdf(pdf_path, 5)
+                        return
 
-                    # Cleanup chapter folder after successful upload
-                    if download_mode == "big":
-                        folder_ch = os.path.join(OUTPUT_DIR, f"chapter-{ch_str}-big")
+                    send_pdf_document(chat_id, pdf_path, f"📖 Chapter {ch_str} ({file_size/(1024*1024):.1f}MB)", pdf_key)
+                    print(f"✅ PDF sent successfully: {pdf_name}")
+                    if manifest:
+                        manifest.mark_sent(ch_str)
+                    auto_delete_pdf(pdf_path, 10)
+                except Exception as upload_error:
+                    print(f"❌ Upload error: {upload_error}")
+                    error_msg = str(upload_error)
+                    if "too large" in error_msg.lower():
+                        bot.send_message(chat_id, f"❌ Chapter {ch_str} terlalu besar untuk Telegram. 💡 Coba gunakan opsi GoFile.")
+                    elif "timeout" in error_msg.lower():
+                        bot.send_message(chat_id, f"⏱️ Upload chapter {ch_str} timeout.")
                     else:
-                        folder_ch = os.path.join(OUTPUT_DIR, f"chapter-{ch_str}")
-                    if os.path.exists(folder_ch):
-                        shutil.rmtree(folder_ch)
-                else:
-                    bot.send_message(chat_id, f"⚠️ Chapter {ch_str} tidak ditemukan.")
+                        bot.send_message(chat_id, f"❌ Gagal upload chapter {ch_str}: {error_msg}")
+                    auto_delete_pdf(pdf_path, 10)
+
+            def drop_item(stage_name, item):
+                # PDFs built before a cancel never reach the upload stage
+                if stage_name == "upload":
+                    auto_delete_pdf(item[2], 0)
+
+            def stage_error(stage_name, item, error):
+                # The chapter is skipped; later chapters carry on
+                ch_str = item if stage_name == "download" else item[0]
+                bot.send_message(chat_id, f"❌ Chapter {ch_str} gagal diproses: {error}")
+
+            gofile_batch = file_uploader.start_batch() if use_gofile else None
+            batch_chapters = {}
+
+            # After a restart, chapters already sent are not downloaded again
+            pending_chapters = [ch for ch in chapters_to_download if not (manifest and manifest.is_sent(ch))]
+            run_pipeline(
+                pending_chapters,
+                [("download", download_stage), ("pdf", pdf_stage), ("upload", upload_stage)],
+                is_cancelled=lambda: bool(user_cancel.get(chat_id)),
+                queue_size=1,
+                on_drop=drop_item,
+                on_error=stage_error
+            )
+
+            if gofile_batch:
+                cancelled = bool(user_cancel.get(chat_id))
+                result = gofile_batch.finish(cancel=cancelled)
+                if not cancelled:
+                    send_gofile_folder_link(chat_id, result, f"{manga_name} chapter {awal}-{akhir}")
+                    if manifest:
+                        for uploaded in result['uploaded']:
+                            manifest.mark_sent(batch_chapters[uploaded['file_path']])
+                    if result['failed']:
+                        bot.send_message(chat_id, "❌ Sebagian file gagal diupload ke GoFile. File akan dikirim langsung.")
+                    for pdf_path, pdf_name in result['failed']:
+                        # Fallback to direct upload if the file is small enough
+                        ch_str = batch_chapters[pdf_path]
+                        file_size = os.path.getsize(pdf_path)
+                        if file_size <= 50 * 1024 * 1024:
+                            try:
+                                send_pdf_document(chat_id, pdf_path, f"📖 Chapter {ch_str} ({file_size/(1024*1024):.1f}MB)", chapter_key(ch_str))
+                                print(f"✅ PDF sent successfully as fallback: {pdf_name}")
+                            except Exception as upload_error:
+                                print(f"❌ Upload error: {upload_error}")
+                                bot.send_message(chat_id, f"❌ Gagal upload chapter {ch_str}: {upload_error}")
+                for pdf_path in batch_chapters:
+                    auto_delete_pdf(pdf_path, 10)
+
+            if user_cancel.get(chat_id):
+                bot.send_message(chat_id, "❌ Download dihentikan! Membersihkan file...")
+                return
 
         if not user_cancel.get(chat_id):
             bot.send_message(chat_id, "✅ Selesai!")
@@ -1779,11 +2017,9 @@ def handle_mode(call):
         except:
             pass
         finally:
-            # Clean up on error
-            cleanup_user_downloads(chat_id)
-            user_state.pop(chat_id, None)
-            user_cancel.pop(chat_id, None)
-            user_downloads.pop(chat_id, None) # Clean user download preferences too
+            # Clean up on error; the job folder goes in run_download_job.
+            # The user may have started a new session meanwhile: leave that one alone
+            release_job_session(chat_id, job_state)
 
 # -------------------- Main --------------------
 if __name__ == "__main__":
@@ -1795,12 +2031,19 @@ if __name__ == "__main__":
     else:
         print("🔧 Running in development mode")
 
+    # Fork the transcode workers while this is still the only thread
+    transcode.start_pool()
     keep_alive()
 
     start_cleanup_scheduler()
     start_smart_auto_ping()  # Use smart auto ping instead
     start_simple_keepalive()
     start_comprehensive_error_monitor()
+    scheduler.start()
+    resume_saved_jobs()
+    # Prefetch only uses the network while no download job is running
+    prefetcher.set_busy_check(lambda: scheduler.active_jobs > 0)
+    file_uploader.refresh_async()
     print("🚀 Bot jalan dengan smart monitoring dan conflict prevention...")
 
     restart_count = 0
@@ -0,0 +1,184 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# In-process counters, gauges and histograms, rendered in the Prometheus text
+# format by keep_alive's /metrics route. Kept dependency-free on purpose: the
+# bot runs on small hosts where prometheus_client is one more thing to install.
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), function=None):
+        super().__init__(name, help_text, labelnames)
+        # Optional callable read at scrape time, for values owned by another object
+        self._function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function):
+        self._function = function
+
+    def render(self):
+        if self._function is not None:
+            try:
+                self.set(self._function())
+            except Exception:
+                pass
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def _render_sample(self, key, state):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state["counts"]):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+        lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+def render():
+    """All registered metrics in Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -------------------- Pipeline stages --------------------
+STAGE_SECONDS = Histogram(
+    "komiku_stage_duration_seconds", "Time spent per call of a pipeline stage", ("stage",)
+)
+STAGE_TOTAL = Counter(
+    "komiku_stage_total", "Pipeline stage calls by result", ("stage", "result")
+)
+STAGE_BYTES = Counter(
+    "komiku_stage_bytes_total", "Bytes fetched, written or sent per pipeline stage", ("stage",)
+)
+
+PREFETCH_BYTES = Counter(
+    "komiku_prefetch_bytes_total", "Speculatively prefetched bytes by outcome (stored, used, discarded)", ("result",)
+)
+
+JOB_QUEUE_DEPTH = Gauge("komiku_job_queue_depth", "Download jobs waiting for a worker")
+ACTIVE_JOBS = Gauge("komiku_active_jobs", "Download jobs currently running")
+JOBS_FINISHED = Counter("komiku_jobs_finished_total", "Finished download jobs", ("mode", "status"))
+
+
+class _StageRecord:
+    def __init__(self):
+        self.ok = True
+        self.bytes = 0
+
+    def fail(self):
+        self.ok = False
+
+    def add_bytes(self, count):
+        self.bytes += count or 0
+
+
+@contextmanager
+def timed(stage):
+    """Time a block as one call of stage; exceptions or record.fail() count as errors"""
+    record = _StageRecord()
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException:
+        record.ok = False
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+        STAGE_TOTAL.inc(stage=stage, result="ok" if record.ok else "error")
+        if record.bytes:
+            STAGE_BYTES.inc(record.bytes, stage=stage)
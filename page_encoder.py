@@ -0,0 +1,221 @@
+import math
+from io import BytesIO
+from PIL import Image
+from imageutil import jpeg_info
+from transcode import load_image, resize_image
+from pdf_writer import encode_jpeg
+
+# Target-size JPEG encoding for PDF pages.
+# plan() samples a few pages, fits a bytes-per-pixel model for candidate
+# quality/scale pairs (binary search over quality, largest scale first) and
+# keeps the best-looking pair whose estimate fits the byte budget. encode()
+# then applies it page by page, nudging quality when the running output
+# drifts from the estimate. Without a budget it only applies the caps.
+
+# Pages decoded for calibration, and the rows/pixels kept from each
+SAMPLE_PAGES = 6
+SAMPLE_MAX_PIXELS = 1500000
+# Scales tried when even the minimum quality is over budget
+SCALE_STEPS = (1.0, 0.85, 0.7, 0.6, 0.5)
+# Quality step used to correct drift while encoding
+DRIFT_STEP = 3
+# Share of the budget planned for; sampled bands slightly underestimate full pages
+SIZE_MARGIN = 0.95
+
+
+class TargetSizeEncoder:
+    def __init__(self, image_paths, max_bytes=None, max_quality=85, min_quality=50, max_pixels=4000000,
+                 passthrough=True, page_overhead=0, file_overhead=0):
+        self.image_paths = list(image_paths)
+        self.max_bytes = max_bytes
+        self.max_quality = max_quality
+        self.min_quality = min(min_quality, max_quality)
+        self.max_pixels = max_pixels
+        self.passthrough = passthrough
+        self.page_overhead = page_overhead
+        self.file_overhead = file_overhead
+
+        self.quality = max_quality
+        self.scale = 1.0
+        # Estimated output bytes per output pixel at (quality, scale); None = no estimate
+        self.bytes_per_pixel = None
+        self._pages = {}
+        self._current_quality = max_quality
+        self._planned = 0.0
+        self._written = 0
+
+    # -------------------- Page headers --------------------
+    def _page(self, img_path):
+        """Header facts for a page: size, file bytes and whether it can be embedded as-is"""
+        page = self._pages.get(img_path)
+        if page is None:
+            with open(img_path, "rb") as f:
+                data = f.read()
+            info = jpeg_info(data)
+            if info:
+                width, height = info["width"], info["height"]
+            else:
+                with Image.open(BytesIO(data)) as img:
+                    width, height = img.size
+            page = {
+                "width": width,
+                "height": height,
+                "file_size": len(data),
+                "embeddable": bool(
+                    self.passthrough and info and info["components"] in (1, 3) and info["bits"] == 8
+                    and width * height <= self.max_pixels
+                ),
+            }
+            self._pages[img_path] = page
+        return page
+
+    def _cap_scale(self, page):
+        """Scale that brings a page down to max_pixels (1.0 if already below)"""
+        pixels = page["width"] * page["height"]
+        return min(1.0, math.sqrt(self.max_pixels / pixels)) if pixels else 1.0
+
+    def _output_pixels(self, page, scale):
+        factor = self._cap_scale(page) * scale
+        return int(page["width"] * factor) * int(page["height"] * factor)
+
+    # -------------------- Calibration --------------------
+    def _load_samples(self, pages):
+        """Decode a few evenly spaced pages, cropped to a middle band of SAMPLE_MAX_PIXELS"""
+        count = min(SAMPLE_PAGES, len(pages))
+        step = len(pages) / count
+        samples = []
+        for i in range(count):
+            img_path, page = pages[int(i * step)]
+            try:
+                with open(img_path, "rb") as f:
+                    img = load_image(f.read())
+                img = img.convert("RGB") if img.mode not in ("RGB", "L") else img
+                cap = self._cap_scale(page)
+                width, height = img.size
+                band = min(height, max(1, int(SAMPLE_MAX_PIXELS / (width * cap * cap))))
+                top = (height - band) // 2
+                crop = img.crop((0, top, width, top + band))
+                if cap < 1.0:
+                    crop = resize_image(crop, (max(1, int(width * cap)), max(1, int(band * cap))))
+                img.close()
+            except Exception as e:
+                # One unreadable page must not cost the whole document; encode() deals with it per page
+                print(f"[!] Error sampling {img_path}: {e}")
+                continue
+            samples.append(crop)
+        return samples
+
+    @staticmethod
+    def _sample_bpp(samples, quality, scale):
+        total_bytes = 0
+        total_pixels = 0
+        for crop in samples:
+            img = crop
+            if scale < 1.0:
+                width, height = crop.size
+                img = resize_image(crop, (max(1, int(width * scale)), max(1, int(height * scale))))
+            data = encode_jpeg(img, quality)[0]
+            total_bytes += len(data)
+            total_pixels += img.size[0] * img.size[1]
+        return total_bytes / total_pixels if total_pixels else 0.0
+
+    def plan(self):
+        """Choose quality and scale for the whole document; returns (quality, scale)"""
+        if self.max_bytes is None:
+            return self.quality, self.scale
+        pages = []
+        for img_path in self.image_paths:
+            try:
+                pages.append((img_path, self._page(img_path)))
+            except Exception as e:
+                print(f"[!] Error reading {img_path}: {e}")
+        if not pages:
+            return self.quality, self.scale
+
+        budget = self.max_bytes - self.file_overhead - len(pages) * self.page_overhead
+        # Everything embedded or encoded at the quality ceiling already fits
+        if sum(page["file_size"] for _, page in pages) <= budget:
+            return self.quality, self.scale
+        budget *= SIZE_MARGIN
+
+        samples = self._load_samples(pages)
+        if not samples:
+            return self.quality, self.scale
+        try:
+            for scale in SCALE_STEPS:
+                pixels = sum(self._output_pixels(page, scale) for _, page in pages)
+
+                def fits(quality):
+                    bpp = self._sample_bpp(samples, quality, scale)
+                    return bpp * pixels <= budget, bpp
+
+                ok, bpp = fits(self.min_quality)
+                if not ok and scale != SCALE_STEPS[-1]:
+                    continue
+
+                # Highest quality that still fits
+                best_quality, best_bpp = self.min_quality, bpp
+                low, high = self.min_quality + 1, self.max_quality
+                while ok and low <= high:
+                    mid = (low + high) // 2
+                    mid_ok, mid_bpp = fits(mid)
+                    if mid_ok:
+                        best_quality, best_bpp = mid, mid_bpp
+                        low = mid + 1
+                    else:
+                        high = mid - 1
+
+                self.quality, self.scale, self.bytes_per_pixel = best_quality, scale, best_bpp
+                self._current_quality = best_quality
+                if not ok:
+                    print(f"[!] Target {self.max_bytes/(1024*1024):.1f}MB tidak tercapai, "
+                          f"pakai minimum quality={best_quality} scale={scale}")
+                print(f"[*] Target size: quality={best_quality} scale={scale} "
+                      f"(perkiraan {best_bpp * pixels/(1024*1024):.1f}MB)")
+                return self.quality, self.scale
+        finally:
+            for crop in samples:
+                crop.close()
+        return self.quality, self.scale
+
+    # -------------------- Encoding --------------------
+    def encode(self, img_path):
+        """Return (jpeg_bytes, width, height, components) for one page"""
+        page = self._page(img_path)
+        pixels = self._output_pixels(page, self.scale)
+        estimate = self.bytes_per_pixel * pixels if self.bytes_per_pixel else None
+
+        # Keep the original bytes when no re-encode is needed or it would not be smaller
+        if page["embeddable"] and self.scale == 1.0 and (estimate is None or page["file_size"] <= estimate):
+            with open(img_path, "rb") as f:
+                data = f.read()
+            info = jpeg_info(data)
+            self._track(len(data), len(data))
+            return data, info["width"], info["height"], info["components"]
+
+        with open(img_path, "rb") as f:
+            img = load_image(f.read(), self._target_size(page))
+        width, height = self._target_size(page)
+        if img.size != (width, height):
+            img = resize_image(img, (width, height))
+        result = encode_jpeg(img, self._current_quality)
+        self._track(len(result[0]), estimate if estimate is not None else len(result[0]))
+        return result
+
+    def _target_size(self, page):
+        factor = self._cap_scale(page) * self.scale
+        if factor >= 1.0:
+            return page["width"], page["height"]
+        return max(1, int(page["width"] * factor)), max(1, int(page["height"] * factor))
+
+    def _track(self, written, planned):
+        """Nudge quality for the next pages when the running total drifts from plan"""
+        self._written += written
+        self._planned += planned
+        if self.bytes_per_pixel is None or not self._planned:
+            return
+        ratio = self._written / self._planned
+        if ratio > 1.05 and self._current_quality > self.min_quality:
+            self._current_quality = max(self.min_quality, self._current_quality - DRIFT_STEP)
+        elif ratio < 0.9 and self._current_quality < self.max_quality:
+            self._current_quality = min(self.max_quality, self._current_quality + DRIFT_STEP)
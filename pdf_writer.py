@@ -0,0 +1,145 @@
+import os
+from io import BytesIO
+
+# Minimal streaming PDF writer for image-only documents.
+# Every page is written to disk as soon as it is added, so memory use stays
+# at one page no matter how many chapters are merged. JPEG data is embedded
+# as-is with /DCTDecode, no decode or re-encode needed.
+
+
+def encode_jpeg(img, quality=85):
+    """Encode a PIL image for a PDF page; returns (data, width, height, components)"""
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    buffer = BytesIO()
+    img.save(buffer, "JPEG", quality=quality, optimize=True)
+    width, height = img.size
+    return buffer.getvalue(), width, height, 1 if img.mode == "L" else 3
+
+
+class StreamingPDFWriter:
+    def __init__(self, path, dpi=72):
+        self.path = path
+        self.dpi = dpi
+        self.page_count = 0
+        # Written under a temp name and renamed on close(), so an existing file
+        # (possibly hardlinked into the PDF cache) is never truncated in place
+        self._tmp_path = f"{path}.part"
+        self._file = open(self._tmp_path, "wb")
+        self._offsets = {}
+        self._page_ids = []
+        # 1 = catalog, 2 = page tree; both are written on close()
+        self._next_id = 3
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    @property
+    def bytes_written(self):
+        return self._file.tell()
+
+    def _new_id(self):
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _write_object(self, obj_id, body, stream=None):
+        self._offsets[obj_id] = self._file.tell()
+        self._file.write(f"{obj_id} 0 obj\n".encode())
+        if stream is None:
+            self._file.write(body.encode())
+        else:
+            self._file.write(body.encode())
+            self._file.write(b"\nstream\n")
+            self._file.write(stream)
+            self._file.write(b"\nendstream")
+        self._file.write(b"\nendobj\n")
+
+    def add_jpeg(self, data, width, height, components=3):
+        """Add a page showing JPEG bytes as they are (DCTDecode passthrough)"""
+        if components == 1:
+            color_space = "/DeviceGray"
+        elif components == 3:
+            color_space = "/DeviceRGB"
+        else:
+            raise ValueError(f"Unsupported JPEG component count: {components}")
+
+        page_w = width * 72.0 / self.dpi
+        page_h = height * 72.0 / self.dpi
+
+        image_id = self._new_id()
+        self._write_object(
+            image_id,
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace {color_space} /BitsPerComponent 8 /Filter /DCTDecode "
+            f"/Length {len(data)} >>",
+            data
+        )
+
+        content = f"q {page_w:.2f} 0 0 {page_h:.2f} 0 0 cm /Im0 Do Q".encode()
+        content_id = self._new_id()
+        self._write_object(content_id, f"<< /Length {len(content)} >>", content)
+
+        page_id = self._new_id()
+        self._write_object(
+            page_id,
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_w:.2f} {page_h:.2f}] "
+            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        self._page_ids.append(page_id)
+        self.page_count += 1
+
+    def mark(self):
+        """Current end of the document, for rollback()"""
+        return self._file.tell(), self._next_id, len(self._page_ids)
+
+    def rollback(self, mark):
+        """Drop every page added since mark() and truncate the file back to it"""
+        offset, next_id, page_count = mark
+        self._file.seek(offset)
+        self._file.truncate()
+        for obj_id in range(next_id, self._next_id):
+            self._offsets.pop(obj_id, None)
+        self._next_id = next_id
+        del self._page_ids[page_count:]
+        self.page_count = page_count
+
+    def add_image(self, img, quality=85):
+        """Encode a PIL image as JPEG and add it as a page"""
+        self.add_jpeg(*encode_jpeg(img, quality))
+
+    def close(self):
+        if self._file.closed:
+            return
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._page_ids)
+        self._write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>")
+        self._write_object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref_offset = self._file.tell()
+        total = self._next_id
+        self._file.write(f"xref\n0 {total}\n".encode())
+        self._file.write(b"0000000000 65535 f \n")
+        for obj_id in range(1, total):
+            self._file.write(f"{self._offsets[obj_id]:010d} 00000 n \n".encode())
+        self._file.write(
+            f"trailer\n<< /Size {total} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+        )
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        """Close and remove a partially written file"""
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
@@ -0,0 +1,105 @@
+import queue
+import threading
+
+# Staged pipeline: each stage runs in its own thread and hands work to the
+# next stage through a bounded queue, so chapter N+1 can download while
+# chapter N is turned into a PDF and chapter N-1 is being uploaded.
+
+_DONE = object()
+
+
+def run_pipeline(items, stages, is_cancelled=None, queue_size=1, on_drop=None, on_error=None):
+    """Push items through stages in order.
+
+    stages is a list of (name, fn) pairs. Each fn takes the output of the
+    previous stage and returns the value for the next one, or None to drop the
+    item. The last stage runs on the calling thread. queue_size bounds how far
+    a stage may run ahead of the next one (backpressure).
+
+    Once is_cancelled() returns True no new item is started; stages keep
+    draining their input queue so no upstream thread is left blocked on put().
+    on_drop(stage_name, item) is called for every item skipped that way, so the
+    caller can remove files that were produced for it.
+
+    A stage that raises drops that item (later stages never see it) and
+    on_error(stage_name, item, error) is called, so the caller can report the
+    failed item instead of the next stage tripping over its missing output.
+    """
+    if not stages:
+        return
+
+    is_cancelled = is_cancelled or (lambda: False)
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) - 1)]
+
+    def process(name, fn, item):
+        if is_cancelled():
+            if on_drop:
+                try:
+                    on_drop(name, item)
+                except Exception as e:
+                    print(f"❌ Pipeline drop handler error: {e}")
+            return None
+        try:
+            return fn(item)
+        except Exception as e:
+            print(f"❌ Pipeline stage '{name}' error: {e}")
+            if on_error:
+                try:
+                    on_error(name, item, e)
+                except Exception as handler_error:
+                    print(f"❌ Pipeline error handler error: {handler_error}")
+            return None
+
+    def source_worker():
+        name, fn = stages[0]
+        try:
+            for item in items:
+                if is_cancelled():
+                    break
+                result = process(name, fn, item)
+                if result is not None:
+                    queues[0].put(result)
+        finally:
+            queues[0].put(_DONE)
+
+    def stage_worker(index):
+        name, fn = stages[index]
+        inbox, outbox = queues[index - 1], queues[index]
+        try:
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    break
+                result = process(name, fn, item)
+                if result is not None:
+                    outbox.put(result)
+        finally:
+            outbox.put(_DONE)
+
+    if len(stages) == 1:
+        name, fn = stages[0]
+        for item in items:
+            if is_cancelled():
+                break
+            process(name, fn, item)
+        return
+
+    threads = [threading.Thread(target=source_worker, name=f"Pipeline-{stages[0][0]}")]
+    for index in range(1, len(stages) - 1):
+        threads.append(threading.Thread(target=stage_worker, args=(index,), name=f"Pipeline-{stages[index][0]}"))
+
+    for t in threads:
+        t.daemon = True
+        t.start()
+
+    # Final stage on the calling thread
+    name, fn = stages[-1]
+    inbox = queues[-1]
+    while True:
+        item = inbox.get()
+        if item is _DONE:
+            break
+        process(name, fn, item)
+
+    for t in threads:
+        t.join()
@@ -0,0 +1,213 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import http_client
+import metrics
+
+# Speculative prefetch while a user is still typing the chapter range.
+# Once the first chapter is known, a background thread fetches its page and
+# first images into an in-memory store at a capped rate, yielding to running
+# download jobs. async_engine.fetch() takes bodies from the store before going
+# to the network. Everything is best effort: a cancelled or failed prefetch
+# just means the download fetches those URLs itself.
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") != "0"
+# Images of the first chapter fetched ahead
+PREFETCH_PAGES = int(os.getenv("PREFETCH_PAGES", "8"))
+# Bandwidth shared by all prefetches (KB/s)
+PREFETCH_MAX_KBPS = int(os.getenv("PREFETCH_MAX_KBPS", "1024"))
+# Memory held by prefetched bodies, and how long an unused one is kept
+PREFETCH_MAX_BYTES = int(os.getenv("PREFETCH_MAX_MB", "64")) * 1024 * 1024
+PREFETCH_TTL = int(os.getenv("PREFETCH_TTL", "900"))
+
+_READ_CHUNK = 64 * 1024
+# How often a paused prefetch checks whether jobs are still running
+_BUSY_POLL = 1.0
+
+
+class PrefetchStore:
+    """Bodies fetched ahead of time, keyed by URL; each one is handed out once"""
+
+    def __init__(self, max_bytes=PREFETCH_MAX_BYTES, ttl=PREFETCH_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # url -> (body, owner, stored_at)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def put(self, url, body, owner=None):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._pop_locked(url)
+            self._entries[url] = (body, owner, time.time())
+            self._size += len(body)
+            self._evict_locked()
+        metrics.PREFETCH_BYTES.inc(len(body), result="stored")
+
+    def take(self, url):
+        """Prefetched body for url (removed from the store), or None"""
+        with self._lock:
+            entry = self._pop_locked(url)
+        if entry is None:
+            return None
+        body, _, stored_at = entry
+        if time.time() - stored_at > self.ttl:
+            metrics.PREFETCH_BYTES.inc(len(body), result="discarded")
+            return None
+        metrics.PREFETCH_BYTES.inc(len(body), result="used")
+        return body
+
+    def __contains__(self, url):
+        with self._lock:
+            return url in self._entries
+
+    def discard(self, owner):
+        """Drop everything prefetched for owner"""
+        with self._lock:
+            urls = [url for url, (_, entry_owner, _) in self._entries.items() if entry_owner == owner]
+            dropped = sum(len(self._pop_locked(url)[0]) for url in urls)
+        if dropped:
+            metrics.PREFETCH_BYTES.inc(dropped, result="discarded")
+
+    def _pop_locked(self, url):
+        entry = self._entries.pop(url, None)
+        if entry is not None:
+            self._size -= len(entry[0])
+        return entry
+
+    def _evict_locked(self):
+        """Expired entries first, then oldest until under max_bytes"""
+        now = time.time()
+        dropped = 0
+        for url in [url for url, (_, _, stored_at) in self._entries.items() if now - stored_at > self.ttl]:
+            dropped += len(self._pop_locked(url)[0])
+        while self._size > self.max_bytes and self._entries:
+            url = next(iter(self._entries))
+            dropped += len(self._pop_locked(url)[0])
+        if dropped:
+            metrics.PREFETCH_BYTES.inc(dropped, result="discarded")
+
+
+class _Throttle:
+    """Token bucket shared by all prefetch threads"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._allowance = rate
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate)
+            self._last = now
+            self._allowance -= amount
+            wait = -self._allowance / self.rate if self._allowance < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class _Task:
+    def __init__(self, owner, page_url):
+        self.owner = owner
+        self.page_url = page_url
+        self.cancelled = threading.Event()
+
+
+class Prefetcher:
+    """Runs at most one prefetch per owner (chat) in a background thread"""
+
+    def __init__(self, store, max_rate=PREFETCH_MAX_KBPS * 1024, pages=PREFETCH_PAGES, enabled=PREFETCH_ENABLED):
+        self.store = store
+        self.pages = pages
+        self.enabled = enabled
+        self._throttle = _Throttle(max_rate)
+        self._tasks = {}
+        self._lock = threading.Lock()
+        # Returns True while real downloads are running; prefetch waits for them
+        self._busy = lambda: False
+
+    def set_busy_check(self, busy):
+        self._busy = busy
+
+    def start(self, owner, page_url, select_images):
+        """Prefetch page_url and the first images select_images(html) returns, replacing owner's prefetch"""
+        if not self.enabled:
+            return
+        task = _Task(owner, page_url)
+        with self._lock:
+            previous = self._tasks.get(owner)
+            if previous and previous.page_url == page_url and not previous.cancelled.is_set():
+                return
+            self._tasks[owner] = task
+        if previous:
+            previous.cancelled.set()
+            self.store.discard(owner)
+        t = threading.Thread(target=self._run, args=(task, select_images), name=f"Prefetch-{owner}")
+        t.daemon = True
+        t.start()
+
+    def cancel(self, owner, discard=True):
+        """Stop owner's prefetch; discard=False keeps what was already fetched for the download"""
+        with self._lock:
+            task = self._tasks.pop(owner, None)
+        if task:
+            task.cancelled.set()
+        if discard:
+            self.store.discard(owner)
+
+    def _run(self, task, select_images):
+        try:
+            html = self._fetch(task, task.page_url)
+            if html is None:
+                return
+            img_urls = select_images(html.decode("utf-8", errors="replace"))[:self.pages]
+            fetched = 0
+            for img_url in img_urls:
+                if self._fetch(task, img_url) is not None:
+                    fetched += 1
+            if not task.cancelled.is_set():
+                print(f"[*] Prefetch {task.page_url}: halaman + {fetched} gambar siap")
+        except Exception as e:
+            print(f"[!] Prefetch {task.page_url} gagal: {e}")
+        finally:
+            with self._lock:
+                if self._tasks.get(task.owner) is task:
+                    del self._tasks[task.owner]
+
+    def _fetch(self, task, url):
+        """Download url into the store at the throttled rate; None if cancelled or failed"""
+        if url in self.store:
+            return None
+        while self._busy():
+            if task.cancelled.wait(_BUSY_POLL):
+                return None
+        if task.cancelled.is_set():
+            return None
+
+        resp = http_client.get(url, stream=True)
+        try:
+            if resp.status_code != 200:
+                return None
+            chunks = []
+            for chunk in resp.iter_content(_READ_CHUNK):
+                if task.cancelled.is_set():
+                    return None
+                self._throttle.consume(len(chunk))
+                chunks.append(chunk)
+        finally:
+            resp.close()
+        if task.cancelled.is_set():
+            return None
+        body = b"".join(chunks)
+        self.store.put(url, body, task.owner)
+        return body
+
+
+store = PrefetchStore()
+prefetcher = Prefetcher(store)
@@ -0,0 +1,171 @@
+import os
+import threading
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+# Big mode decode/resize/encode runs in worker processes, one per core, so the
+# LANCZOS upscale and quality=100 JPEG save no longer share a single GIL with
+# the download threads.
+
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", str(os.cpu_count() or 1)))
+
+# Resize engine: images taller than this are resampled in horizontal tiles of
+# TILE_HEIGHT output rows, so the resampler's intermediate buffer stays small
+TILE_THRESHOLD = int(os.getenv("RESIZE_TILE_THRESHOLD", "4096"))
+TILE_HEIGHT = int(os.getenv("RESIZE_TILE_HEIGHT", "1024"))
+
+_pool = None
+_pool_lock = threading.Lock()
+# Set by start_pool(): workers were forked before other threads existed, so
+# the pool must not be re-created (forked again) once the bot is running
+_started_early = False
+
+
+def start_pool():
+    """Create the pool and fork its workers now.
+
+    Call at startup before any other thread exists: a fork taken while
+    another thread holds a lock (logging, the HTTP pool, the asyncio loop)
+    copies that lock held into the child, which can then deadlock on it.
+    """
+    global _started_early
+    pool = get_pool()
+    if pool is None:
+        return None
+    # With fork the executor starts all its workers on the first submit
+    pool.submit(os.getpid).result()
+    _started_early = True
+    return pool
+
+
+def get_pool():
+    """Return the shared process pool, or None if processes can't be used here.
+
+    Uses the fork start method: spawn/forkserver would re-import main.py in
+    every worker and run its startup code (cleanup, bot init) again. The bot
+    forks the workers up front with start_pool(); scripts that never call it
+    get the pool on first use.
+    """
+    global _pool
+    if TRANSCODE_WORKERS <= 0:
+        return None
+    try:
+        context = multiprocessing.get_context("fork")
+    except ValueError:
+        return None
+
+    with _pool_lock:
+        # A worker that died (e.g. OOM on a huge page) breaks the whole pool
+        if _pool is not None and getattr(_pool, "_broken", False):
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+            if _started_early:
+                # Forking now could deadlock a child; big mode falls back to threads
+                print("⚠️ Transcode pool broken, falling back to threads")
+                return None
+            print("⚠️ Transcode pool broken, creating a new one")
+        if _pool is None:
+            if _started_early:
+                return None
+            _pool = ProcessPoolExecutor(max_workers=TRANSCODE_WORKERS, mp_context=context)
+            print(f"🧮 Transcode pool started with {TRANSCODE_WORKERS} processes")
+        return _pool
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def load_image(source, target_size=None):
+    """Open bytes or a path; JPEGs are draft-decoded when target_size is at least 2x smaller.
+
+    draft() lets libjpeg decode at 1/2, 1/4 or 1/8 scale directly, never below
+    target_size, so a big downscale never materializes the full-size bitmap.
+    """
+    img = Image.open(BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+    if target_size and img.format == "JPEG":
+        width, height = img.size
+        if target_size[0] * 2 <= width and target_size[1] * 2 <= height:
+            img.draft("RGB", target_size)
+    return img
+
+
+def resize_image(img, size, resample=Image.Resampling.LANCZOS):
+    """Resize with reduce() for large downscales and tiling for tall strips"""
+    width, height = img.size
+    new_width, new_height = size
+    if (new_width, new_height) == (width, height):
+        return img
+    # Palette/1-bit images would otherwise be resampled with NEAREST
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    # Integer box reduce first, the final resample then works on a smaller image
+    factor = min(width // new_width, height // new_height) if new_width and new_height else 1
+    if factor >= 2:
+        img = img.reduce(factor)
+        width, height = img.size
+
+    if height <= TILE_THRESHOLD and new_height <= TILE_THRESHOLD:
+        return img.resize(size, resample)
+    return _resize_tiled(img, size, resample)
+
+
+def _resize_tiled(img, size, resample):
+    """Resample a tall image in bands of TILE_HEIGHT output rows.
+
+    resize(box=...) samples source pixels outside the box for the filter
+    support, so the bands join without seams.
+    """
+    width, height = img.size
+    new_width, new_height = size
+    scale_y = height / new_height
+
+    out = Image.new(img.mode, size)
+    for top in range(0, new_height, TILE_HEIGHT):
+        bottom = min(new_height, top + TILE_HEIGHT)
+        box = (0, top * scale_y, width, min(height, bottom * scale_y))
+        band = img.resize((new_width, bottom - top), resample, box=box)
+        out.paste(band, (0, top))
+        band.close()
+    return out
+
+
+def scaled_size(width, height, scale):
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def big_mode_size(width, height):
+    """Target size for big mode: at least 1200px wide, otherwise 150%"""
+    min_width = 1200
+    if width < min_width:
+        return min_width, int(height * (min_width / width))
+    return int(width * 1.5), int(height * 1.5)
+
+
+def transcode_big(content, img_path):
+    """Decode, upscale for big mode and save as a quality=100 JPEG at img_path"""
+    img = load_image(content)
+
+    # Get original dimensions
+    original_width, original_height = img.size
+
+    # Ensure consistent sizing for BIG mode
+    new_width, new_height = big_mode_size(original_width, original_height)
+
+    # Resize using high-quality resampling (tiled for tall webtoon strips)
+    img_resized = resize_image(img, (new_width, new_height))
+
+    # Convert to RGB if necessary
+    if img_resized.mode != "RGB":
+        img_resized = img_resized.convert("RGB")
+
+    # Save with maximum quality for BIG mode
+    img_resized.save(img_path, "JPEG", quality=100, optimize=False)
+    return f" - Ukuran: {original_width}x{original_height} → {new_width}x{new_height}"
@@ -1,39 +1,200 @@
-
 import os
+import uuid
+import random
 import requests
+import http_client
+import metrics
 import json
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# GoFile endpoints
+GOFILE_API_URL = os.getenv("GOFILE_API_URL", "https://api.gofile.io")
+GOFILE_UPLOAD_URL = os.getenv("GOFILE_UPLOAD_URL", "https://{server}.gofile.io/contents/uploadfile")
+
+# Seconds a discovered store ranking is trusted before a background refresh
+GOFILE_SERVER_TTL = int(os.getenv("GOFILE_SERVER_TTL", "900"))
+# Latency probe: per-store timeout and how many candidate stores to probe
+GOFILE_PROBE_TIMEOUT = 3
+GOFILE_PROBE_MAX = 6
+
+# Files of one batch uploaded at the same time
+GOFILE_BATCH_WORKERS = int(os.getenv("GOFILE_BATCH_WORKERS", "3"))
+
+# Bytes read from disk per chunk while streaming an upload
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_KB", "1024")) * 1024
+# Backoff between upload attempts: base * 2^attempt (+ jitter), capped
+UPLOAD_RETRY_BASE = 1.0
+UPLOAD_RETRY_MAX = 20.0
+
+
+class MultipartFileEncoder:
+    """multipart/form-data body that streams one file from disk in fixed-size chunks.
+
+    requests sends any object with __iter__/__len__ as a streamed body with a
+    Content-Length, so memory stays at one chunk however large the file is.
+    progress(sent, total, bytes_per_second) is called after every chunk.
+    """
+
+    def __init__(self, fields, file_field, file_path, file_name, content_type="application/octet-stream",
+                 chunk_size=UPLOAD_CHUNK_SIZE, progress=None):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.chunk_size = chunk_size
+        self.progress = progress
+
+        head = []
+        for name, value in fields.items():
+            head.append(
+                f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            )
+        safe_name = file_name.replace('"', "'")
+        head.append(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{safe_name}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        )
+        self._head = "".join(head).encode("utf-8")
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode()
+
+        self.file_size = os.path.getsize(file_path)
+        self.len = len(self._head) + self.file_size + len(self._tail)
+        self._file = open(file_path, "rb")
+        self._chunks = self._generate()
+        self._buffer = memoryview(b"")
+        self.bytes_read = 0
+        self.started_at = None
+
+    def __len__(self):
+        return self.len
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    @property
+    def rate(self):
+        """Average bytes per second since the first read"""
+        if not self.started_at:
+            return 0.0
+        elapsed = time.monotonic() - self.started_at
+        return self.bytes_read / elapsed if elapsed > 0 else 0.0
+
+    def _generate(self):
+        yield self._head
+        with self._file:
+            while True:
+                chunk = self._file.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        yield self._tail
+
+    def read(self, size=-1):
+        if self.started_at is None:
+            self.started_at = time.monotonic()
+        if size is None or size < 0:
+            size = self.chunk_size
+        if not self._buffer:
+            self._buffer = memoryview(next(self._chunks, b""))
+        # memoryview slices avoid re-copying the rest of the chunk on every read
+        chunk, self._buffer = self._buffer[:size].tobytes(), self._buffer[size:]
+        if chunk:
+            self.bytes_read += len(chunk)
+            if self.progress:
+                try:
+                    self.progress(self.bytes_read, self.len, self.rate)
+                except Exception:
+                    pass
+        return chunk
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def _parse_servers(data):
+    """Store names from a /servers payload, in the order GoFile listed them"""
+    if isinstance(data, dict):
+        if isinstance(data.get('servers'), list):
+            items = data['servers'] + data.get('serversAllZone', [])
+        elif 'server' in data:  # Old /getServer shape
+            items = [data['server']]
+        else:
+            items = list(data.keys())
+    elif isinstance(data, list):
+        items = data
+    else:
+        items = []
+
+    names = []
+    for item in items:
+        name = item.get('name') if isinstance(item, dict) else item
+        if name and name not in names:
+            names.append(str(name))
+    return names
+
 
 class GoFileUploader:
-    def __init__(self):
-        self.base_url = "https://api.gofile.io"
+    def __init__(self, base_url=None, upload_url=None, server_ttl=GOFILE_SERVER_TTL):
+        self.base_url = (base_url or GOFILE_API_URL).rstrip("/")
+        # Upload endpoint template, {server} is replaced with the store name
+        self.upload_url = upload_url or GOFILE_UPLOAD_URL
         self.server = None
         self.fallback_servers = ["store1", "store2", "store3", "store4", "store5"]
-        self.get_server()
-    
+        # Stores ranked by measured latency, fastest first
+        self.servers = []
+        self.server_ttl = server_ttl
+        self._server_checked_at = 0.0
+        self._server_lock = threading.Lock()
+        self._refresh_thread = None
+        # No network here: discovery happens on first use or via refresh_async()
+
+    def _probe_latency(self, server):
+        """Round-trip time of a HEAD to the store's upload endpoint, None if unreachable or erroring"""
+        start = time.monotonic()
+        try:
+            response = http_client.head(self.upload_url.format(server=server), timeout=GOFILE_PROBE_TIMEOUT)
+        except requests.exceptions.RequestException:
+            return None
+        # A store answering 4xx/5xx is down or refusing uploads, however fast it answers
+        if response.status_code >= 400:
+            return None
+        return time.monotonic() - start
+
+    def _rank_servers(self, candidates):
+        candidates = candidates[:GOFILE_PROBE_MAX]
+        with ThreadPoolExecutor(max_workers=len(candidates)) as pool:
+            latencies = dict(zip(candidates, pool.map(self._probe_latency, candidates)))
+        healthy = sorted((latency, name) for name, latency in latencies.items() if latency is not None)
+        for latency, name in healthy:
+            print(f"   📡 {name}: {latency * 1000:.0f}ms")
+        return [name for _, name in healthy]
+
     def get_server(self, retry=3):
-        """Get the best server for upload with retry mechanism"""
+        """Get the best server for upload with retry mechanism.
+
+        Candidates from /servers are probed in parallel and ranked by latency;
+        the fastest healthy one becomes self.server.
+        """
         # Try official API first
         for attempt in range(retry):
             try:
                 print(f"🔍 Getting GoFile server (attempt {attempt + 1}/{retry})...")
-                response = requests.get(f"{self.base_url}/servers", timeout=10)
+                response = http_client.get(f"{self.base_url}/servers", timeout=10)
                 
                 if response.status_code == 200:
                     data = response.json()
-                    if data.get('status') == 'ok' and 'data' in data:
-                        servers = data['data']
-                        if isinstance(servers, dict) and servers:
-                            # Get first available server
-                            self.server = list(servers.keys())[0]
-                            print(f"✅ GoFile server ready: {self.server}")
-                            return True
-                        elif isinstance(servers, list) and servers:
-                            self.server = servers[0]['name']
-                            print(f"✅ GoFile server ready: {self.server}")
-                            return True
-                    else:
-                        print(f"❌ GoFile server response error: {data}")
+                    candidates = _parse_servers(data.get('data')) if data.get('status') == 'ok' else []
+                    if candidates:
+                        ranked = self._rank_servers(candidates)
+                        self._set_servers(ranked or candidates)
+                        print(f"✅ GoFile server ready: {self.server}")
+                        return True
+                    print(f"❌ GoFile server response error: {data}")
                 else:
                     print(f"❌ GoFile server HTTP error: {response.status_code}")
                     
@@ -49,18 +210,61 @@ class GoFileUploader:
         
         # If official API fails, use fallback server
         print("🔄 Using fallback server...")
-        self.server = self.fallback_servers[0]  # Use store1 as default
+        self._set_servers(self.fallback_servers)  # Use store1 as default
         print(f"✅ GoFile fallback server ready: {self.server}")
         return True
-    
-    def upload_file(self, file_path, file_name=None):
-        """Upload file to GoFile with improved error handling and correct API"""
+
+    def _set_servers(self, servers):
+        with self._server_lock:
+            self.servers = list(servers)
+            self.server = self.servers[0]
+            self._server_checked_at = time.time()
+
+    def _server_is_fresh(self):
+        return self.server is not None and time.time() - self._server_checked_at < self.server_ttl
+
+    def refresh_async(self):
+        """Re-run server discovery in a background thread (no-op if one is running)"""
+        with self._server_lock:
+            if self._refresh_thread and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self.get_server, name="GoFileDiscovery")
+            self._refresh_thread.daemon = True
+            self._refresh_thread.start()
+
+    def current_server(self):
+        """Cached store name; a stale one is still used while a refresh runs in the background"""
+        if self._server_is_fresh():
+            return self.server
+        if self.server is not None:
+            self.refresh_async()
+            return self.server
+        # Nothing known yet: wait for a refresh already started, else discover now
+        thread = self._refresh_thread
+        if thread and thread.is_alive():
+            thread.join()
+        if self.server is None:
+            self.get_server()
+        return self.server
+
+    def upload_targets(self):
+        """Upload URLs to try in order: ranked stores first, then the static fallbacks"""
+        server = self.current_server()
+        order = [server] + [s for s in self.servers if s != server]
+        order += [s for s in self.fallback_servers if s not in order]
+        return [self.upload_url.format(server=name) for name in order[:5]]
+
+    def upload_file(self, file_path, file_name=None, progress=None, folder_id=None, token=None):
+        """Upload file to GoFile with improved error handling and correct API.
+
+        The body is streamed from disk; progress(sent, total, bytes_per_second)
+        is called as chunks go out. folder_id/token put the file into an
+        existing folder (see GoFileBatch).
+        """
         # Try to get server if not available
-        if not self.server:
-            print("🔄 Attempting to reconnect to GoFile server...")
-            if not self.get_server():
-                print("❌ GoFile server not available")
-                return None
+        if not self.current_server():
+            print("❌ GoFile server not available")
+            return None
         
         try:
             if not file_name:
@@ -70,25 +274,25 @@ class GoFileUploader:
             print(f"📤 Uploading {file_name} ({file_size/(1024*1024):.1f}MB) to GoFile...")
             
             # Updated upload URLs with correct GoFile API
-            upload_attempts = [
-                f"https://{self.server}.gofile.io/contents/uploadfile",
-                "https://store1.gofile.io/contents/uploadfile", 
-                "https://store2.gofile.io/contents/uploadfile",
-                "https://store3.gofile.io/contents/uploadfile",
-                "https://store4.gofile.io/contents/uploadfile"
-            ]
+            upload_attempts = self.upload_targets()
             
             for attempt, upload_url in enumerate(upload_attempts):
                 try:
                     print(f"🔄 Upload attempt {attempt + 1} to {upload_url}")
                     
-                    with open(file_path, 'rb') as file_data:
-                        files = {'file': (file_name, file_data, 'application/pdf')}
-                        data_payload = {'folderId': ''}  # Empty folder ID for root
-                        
+                    # Empty folder ID for root
+                    body = MultipartFileEncoder({'folderId': folder_id or ''}, 'file', file_path, file_name,
+                                                'application/pdf', progress=progress)
+                    headers = {'Content-Type': body.content_type}
+                    if token:
+                        headers['Authorization'] = f"Bearer {token}"
+                    try:
                         # Upload with longer timeout for large files
                         timeout = max(300, file_size // (1024 * 1024) * 10)  # 10s per MB, min 5 min
-                        response = requests.post(upload_url, files=files, data=data_payload, timeout=timeout)
+                        response = http_client.post(upload_url, data=body, timeout=timeout, headers=headers)
+                    finally:
+                        body.close()
+                    print(f"📶 Upload throughput: {body.rate/(1024*1024):.2f}MB/s")
                     
                     if response.status_code == 200:
                         try:
@@ -113,7 +317,11 @@ class GoFileUploader:
                                         'download_page': download_page,
                                         'direct_link': direct_link,
                                         'file_name': file_name,
-                                        'file_size': file_size
+                                        'file_size': file_size,
+                                        # Guest uploads create a folder; later files can join it
+                                        'folder_id': file_info.get('parentFolder'),
+                                        'folder_code': file_info.get('parentFolderCode'),
+                                        'guest_token': file_info.get('guestToken')
                                     }
                                 else:
                                     print(f"❌ GoFile response missing download info: {response_data}")
@@ -133,10 +341,11 @@ class GoFileUploader:
                 except Exception as ue:
                     print(f"❌ Upload error for attempt {attempt + 1}: {ue}")
                 
-                # Wait before next attempt
+                # Exponential backoff with jitter before the next store
                 if attempt < len(upload_attempts) - 1:
-                    print("⏳ Waiting 3s before next upload attempt...")
-                    time.sleep(3)
+                    wait_time = min(UPLOAD_RETRY_MAX, UPLOAD_RETRY_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+                    print(f"⏳ Waiting {wait_time:.1f}s before next upload attempt...")
+                    time.sleep(wait_time)
             
             print("❌ All GoFile upload attempts failed")
             return None
@@ -148,16 +357,120 @@ class GoFileUploader:
             print(f"❌ GoFile upload error: {e}")
             return None
     
+    def start_batch(self, progress=None, max_workers=GOFILE_BATCH_WORKERS):
+        """Open a GoFileBatch that uploads several files into one folder"""
+        return GoFileBatch(self, progress=progress, max_workers=max_workers)
+
+    def upload_files(self, file_paths, progress=None, max_workers=GOFILE_BATCH_WORKERS):
+        """Upload file_paths concurrently into one folder; see GoFileBatch.finish()"""
+        batch = self.start_batch(progress=progress, max_workers=max_workers)
+        for path in file_paths:
+            batch.add(path)
+        return batch.finish()
+
     def is_available(self):
         """Check if GoFile service is available"""
-        if not self.server:
-            return self.get_server()
-        return True
+        return self.current_server() is not None
     
     def test_connection(self):
         """Test GoFile connection"""
         try:
-            response = requests.get(f"{self.base_url}/getServer", timeout=5)
+            response = http_client.get(f"{self.base_url}/getServer", timeout=5)
             return response.status_code == 200
         except:
             return False
+
+
+class GoFileBatch:
+    """Upload several files into one GoFile folder, concurrently.
+
+    The first file creates a guest folder; its guestToken and parentFolder are
+    reused so every later file lands in the same folder. Files can be added
+    while earlier ones are still uploading (e.g. from a pipeline stage).
+    """
+
+    def __init__(self, uploader, progress=None, max_workers=GOFILE_BATCH_WORKERS):
+        self.uploader = uploader
+        self.progress = progress
+        self.folder_id = None
+        self.folder_code = None
+        self.token = None
+        self.folder_link = None
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="GoFileBatch")
+        self._folder_ready = threading.Event()
+        self._lock = threading.Lock()
+        self._items = []
+        self._sent = {}
+        self._sizes = {}
+        self._started_at = None
+
+    def add(self, file_path, file_name=None):
+        file_name = file_name or os.path.basename(file_path)
+        with self._lock:
+            first = not self._items
+            if self._started_at is None:
+                self._started_at = time.monotonic()
+            self._sizes[file_path] = os.path.getsize(file_path)
+            future = self._pool.submit(self._upload, file_path, file_name, first)
+            self._items.append((file_path, file_name, future))
+        return future
+
+    def _report(self, file_path, sent):
+        if not self.progress:
+            return
+        with self._lock:
+            self._sent[file_path] = sent
+            total_sent = sum(self._sent.values())
+            total = sum(self._sizes.values())
+            elapsed = time.monotonic() - self._started_at
+        self.progress(total_sent, total, total_sent / elapsed if elapsed > 0 else 0.0)
+
+    def _upload(self, file_path, file_name, first):
+        if not first:
+            # Wait for the first file's response to learn the folder
+            self._folder_ready.wait()
+        try:
+            with metrics.timed("gofile_upload") as stage:
+                result = self.uploader.upload_file(
+                    file_path, file_name,
+                    progress=lambda sent, total, rate: self._report(file_path, min(sent, self._sizes[file_path])),
+                    folder_id=self.folder_id, token=self.token
+                )
+                if result:
+                    stage.add_bytes(result['file_size'])
+                else:
+                    stage.fail()
+            if first and result and result.get('folder_id') and result.get('guest_token'):
+                self.folder_id = result['folder_id']
+                self.folder_code = result.get('folder_code')
+                self.token = result['guest_token']
+                # For guest uploads downloadPage is the folder's page
+                self.folder_link = result['download_page']
+            return result
+        finally:
+            if first:
+                # Without a folder the rest still upload, each on its own
+                self._folder_ready.set()
+
+    def finish(self, cancel=False):
+        """Wait for all uploads; returns {'folder_link', 'uploaded': [...], 'failed': [(path, name)]}"""
+        uploaded, failed = [], []
+        with self._lock:
+            items = list(self._items)
+        if cancel:
+            for _, _, future in items:
+                future.cancel()
+            self._folder_ready.set()
+        for file_path, file_name, future in items:
+            try:
+                result = None if future.cancelled() else future.result()
+            except Exception as e:
+                print(f"❌ GoFile batch upload error for {file_name}: {e}")
+                result = None
+            if result:
+                result['file_path'] = file_path
+                uploaded.append(result)
+            else:
+                failed.append((file_path, file_name))
+        self._pool.shutdown(wait=True)
+        return {'folder_link': self.folder_link, 'uploaded': uploaded, 'failed': failed}